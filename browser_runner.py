@@ -141,6 +141,11 @@ def is_429(report):
     err = (report.get("error") or "").lower()
     return "429" in err or "rate limit" in err or "too many requests" in err
 
+def circuit_open(report):
+    """llmClient failed fast because every endpoint's circuit breaker is open."""
+    if not report or report.get("ok"): return False
+    return bool(report.get("circuit_open")) or "circuit open" in (report.get("error") or "").lower()
+
 # ---------------- main ----------------
 def main():
     ap = argparse.ArgumentParser(description="Run strong-type E2E cases against the portal UI")
@@ -163,6 +168,7 @@ def main():
     # 429 handling
     ap.add_argument("--cooldown_after_n_429", type=int, default=2)
     ap.add_argument("--cooldown_ms", type=int, default=90000)
+    ap.add_argument("--circuit_retries", type=int, default=3, help="re-runs of a case after a circuit-open pause")
 
     # batching
     ap.add_argument("--batch_size", type=int, default=10, help="cases per batch before pausing")
@@ -220,7 +226,11 @@ def main():
             "total_runs": 0, "pass": 0, "borderline": 0, "fail": 0,
             "by_type": {},
             "avg_trs": 0, "avg_duration_ms": 0,
-            "429s": 0
+            "total_tokens": 0, "total_llm_calls": 0,
+            "total_generate_calls": 0, "total_critic_calls": 0,
+            "avg_tokens_per_case": 0, "avg_calls_per_case": 0,
+            "avg_generate_calls_per_case": 0, "avg_critic_calls_per_case": 0,
+            "429s": 0, "circuit_pauses": 0
         }
         trs_vals, dur_vals = [], []
 
@@ -238,6 +248,17 @@ def main():
                     t0 = time.time()
                     result = page.evaluate(PAGE_EVAL, [typename, params])
                     report, logs = result.get("report"), result.get("_logs", [])
+                    # circuit open: the endpoint is down/throttling — pause everything and re-run
+                    # this case instead of failing fast through the rest of the batch
+                    for _ in range(args.circuit_retries):
+                        if not circuit_open(report): break
+                        stats["circuit_pauses"] += 1
+                        pause = int(report.get("retry_in_ms") or args.cooldown_ms) + 1000
+                        builtins.print(f"   ⛔ circuit open — pausing {pause}ms, then retrying this case …")
+                        snooze(pause)
+                        t0 = time.time()
+                        result = page.evaluate(PAGE_EVAL, [typename, params])
+                        report, logs = result.get("report"), result.get("_logs", [])
                     duration_ms = int((time.time() - t0) * 1000)
 
                     row = {
@@ -248,7 +269,7 @@ def main():
                     f.write(json.dumps(row, ensure_ascii=False) + "\n")
 
                     stats["total_runs"] += 1
-                    stats["by_type"].setdefault(typename, {"count":0,"pass":0,"borderline":0,"fail":0})
+                    stats["by_type"].setdefault(typename, {"count":0,"pass":0,"borderline":0,"fail":0,"tokens":0,"llm_calls":0,"generate_calls":0,"critic_calls":0})
                     stats["by_type"][typename]["count"] += 1
 
                     verdict = ((report or {}).get("scoring") or {}).get("verdict")
@@ -256,6 +277,19 @@ def main():
                     if isinstance(trs, (int, float)): trs_vals.append(trs)
                     dur_vals.append(duration_ms)
 
+                    usage = (report or {}).get("usage") or {}
+                    tokens, calls = int(usage.get("total_tokens") or 0), int(usage.get("calls") or 0)
+                    stats["total_tokens"] += tokens
+                    stats["total_llm_calls"] += calls
+                    stats["by_type"][typename]["tokens"] += tokens
+                    stats["by_type"][typename]["llm_calls"] += calls
+                    # where the call budget goes: drafts/revisions vs TRS critic
+                    gen_calls, critic_calls = int(usage.get("generate_calls") or 0), int(usage.get("critic_calls") or 0)
+                    stats["total_generate_calls"] += gen_calls
+                    stats["total_critic_calls"] += critic_calls
+                    stats["by_type"][typename]["generate_calls"] += gen_calls
+                    stats["by_type"][typename]["critic_calls"] += critic_calls
+
                     if verdict in ("pass","borderline","fail"):
                         stats[verdict] += 1
                         stats["by_type"][typename][verdict] += 1
@@ -291,6 +325,27 @@ def main():
 
         if trs_vals: stats["avg_trs"] = round(sum(trs_vals)/len(trs_vals), 2)
         if dur_vals: stats["avg_duration_ms"] = int(sum(dur_vals)/len(dur_vals))
+        if stats["total_runs"]:
+            stats["avg_tokens_per_case"] = round(stats["total_tokens"] / stats["total_runs"], 1)
+            stats["avg_calls_per_case"] = round(stats["total_llm_calls"] / stats["total_runs"], 2)
+            stats["avg_generate_calls_per_case"] = round(stats["total_generate_calls"] / stats["total_runs"], 2)
+            stats["avg_critic_calls_per_case"] = round(stats["total_critic_calls"] / stats["total_runs"], 2)
+        for t in stats["by_type"].values():
+            if t["count"]:
+                t["avg_tokens"] = round(t["tokens"] / t["count"], 1)
+                t["avg_calls"] = round(t["llm_calls"] / t["count"], 2)
+                t["avg_generate_calls"] = round(t["generate_calls"] / t["count"], 2)
+                t["avg_critic_calls"] = round(t["critic_calls"] / t["count"], 2)
+
+        if stats["total_runs"]:
+            builtins.print("\n🧾 LLM usage per case (averages)")
+            builtins.print(f"   {'type':<24} {'cases':>7} {'calls':>7} {'gen':>7} {'critic':>7} {'tokens':>9}")
+            rows = [(name, t["count"], t["avg_calls"], t["avg_generate_calls"], t["avg_critic_calls"], t["avg_tokens"])
+                    for name, t in sorted(stats["by_type"].items()) if t["count"]]
+            rows.append(("all", stats["total_runs"], stats["avg_calls_per_case"], stats["avg_generate_calls_per_case"],
+                         stats["avg_critic_calls_per_case"], stats["avg_tokens_per_case"]))
+            for name, n, calls, gen, critic, tokens in rows:
+                builtins.print(f"   {name:<24} {n:>7} {calls:>7} {gen:>7} {critic:>7} {tokens:>9}")
 
         with open(summary_path, "w", encoding="utf-8") as s:
             json.dump(stats, s, indent=2)
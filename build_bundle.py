@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Bundle Builder - Lemonade Self-Service Portal
+
+Optional production build. The app runs unbundled straight from src/ (index.html
+preloads the startup module graph with <link rel="modulepreload">); this produces a
+variant that loads as one request:
+
+  - dist/main.js             src/main.js + its static imports, one minified ES module
+  - dist/chunks/*.js         kpis.js / feedbackDb.js (dynamic imports in main.js), fetched
+                             when the KPI drawer opens or the first result is shown, and
+                             orchestrator.js + its imports (pipelineClient.js's in-page
+                             fallback when the worker can't run)
+  - dist/pipelineWorker.js   the pipeline worker, bundled on its own (pipelineClient.js
+                             resolves it next to the main bundle via import.meta.url)
+  - index.bundle.html        index.html pointed at dist/main.js
+
+dist/ sits one level below the app root like src/, so import.meta.url-relative URLs
+(the worker, corpus.js APP_ROOT) resolve the same way. dist/ and index.bundle.html
+are build output — rebuild after editing src/.
+
+Before building, checks that index.html's modulepreload hints match the static import
+graph of src/main.js (main.js, ui.js, pipelineClient.js): nothing missing, and nothing
+that is only loaded lazily — the pipeline modules run in the worker. The LAZY modules
+(orchestrator.js, kpis.js, feedbackDb.js) must not be statically reachable from main.js.
+--check does only that and needs nothing but Python.
+
+Bundling uses esbuild (https://esbuild.github.io): an `esbuild` binary on PATH or in
+./node_modules/.bin (npm install --no-save esbuild).
+
+Usage:
+    python build_bundle.py               # check preloads, build dist/ + index.bundle.html
+    python build_bundle.py --check       # check modulepreload hints only
+    python build_bundle.py --no-minify   # readable output for debugging
+"""
+
+import argparse
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import sys
+
+ENTRY = "src/main.js"
+WORKER = "src/pipelineWorker.js"
+INDEX = "index.html"
+BUNDLE_INDEX = "index.bundle.html"
+# loaded with import() on the page; a static import would put them back on the startup path
+LAZY = ["src/orchestrator.js", "src/kpis.js", "src/feedbackDb.js"]
+
+# static `import … from './x.js'` / `export … from './x.js'` / `import './x.js'`; not import()
+STATIC_IMPORT = re.compile(r"""^\s*(?:import|export)\s+(?:[^;'"]*?\s+from\s+)?['"](\.{1,2}/[^'"]+)['"]""", re.M)
+PRELOAD = re.compile(r"""<link\s+[^>]*rel=["']modulepreload["'][^>]*>""", re.I)
+HREF = re.compile(r"""href=["']([^"']+)["']""", re.I)
+PRELOAD_COMMENT = re.compile(r"<!-- startup module graph.*?-->\s*", re.S)
+
+
+def static_graph(entry):
+    """Modules reachable from `entry` through static imports, in BFS order (root-relative paths)."""
+    order, seen, queue = [], {entry}, [entry]
+    while queue:
+        mod = queue.pop(0)
+        order.append(mod)
+        try:
+            with open(mod, encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            raise SystemExit(f"❌ Cannot read {mod}: {e}")
+        for spec in STATIC_IMPORT.findall(text):
+            dep = posixpath.normpath(posixpath.join(posixpath.dirname(mod), spec))
+            if dep not in seen:
+                seen.add(dep)
+                queue.append(dep)
+    return order
+
+
+def preload_hints(html):
+    """Root-relative hrefs of the modulepreload links in `html`."""
+    hrefs = []
+    for tag in PRELOAD.findall(html):
+        m = HREF.search(tag)
+        if m:
+            hrefs.append(posixpath.normpath(m.group(1)))  # normpath drops a leading ./
+    return hrefs
+
+
+def check_preloads(index_path, entry):
+    """Return a list of problems with index.html's modulepreload hints (empty = in sync)."""
+    with open(index_path, encoding="utf-8") as f:
+        html = f.read()
+    graph = static_graph(entry)
+    hints = preload_hints(html)
+    problems = [f"{index_path}: missing <link rel=\"modulepreload\" href=\"./{m}\" />" for m in graph if m not in hints]
+    problems += [f"{index_path}: ./{h} is preloaded but not statically imported from {entry} "
+                 f"(lazy or unused — preloading it defeats the deferral)" for h in hints if h not in graph]
+    problems += [f"{entry}: ./{m} is statically reachable but must stay lazy (load it with import())"
+                 for m in LAZY if m in graph]
+    return graph, problems
+
+
+def find_esbuild():
+    local = os.path.join("node_modules", ".bin", "esbuild")
+    if os.path.exists(local):
+        return local
+    return shutil.which("esbuild")
+
+
+def run(cmd):
+    print("  $ " + " ".join(cmd))
+    return subprocess.run(cmd).returncode == 0
+
+
+def bundle_index(html, out_url):
+    """index.html → index.bundle.html: one preload + script pointing at the bundle."""
+    html = PRELOAD_COMMENT.sub("", html)
+    html = re.sub(r"[ \t]*" + PRELOAD.pattern + r"\n?", "", html, flags=re.I)
+    html = html.replace("</head>", f'  <link rel="modulepreload" href="./{out_url}/main.js" />\n</head>', 1)
+    return html.replace('src="./src/main.js"', f'src="./{out_url}/main.js"')
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check modulepreload hints and build the optional bundled app")
+    ap.add_argument("--out", default="dist", help="output directory (one level below the app root)")
+    ap.add_argument("--check", action="store_true", help="check index.html modulepreload hints only")
+    ap.add_argument("--no-minify", action="store_true", help="skip minification")
+    args = ap.parse_args()
+
+    graph, problems = check_preloads(INDEX, ENTRY)
+    if problems:
+        for p in problems:
+            print(f"❌ {p}")
+        print(f"\n{len(problems)} problem(s) with modulepreload hints.")
+        return 1
+    print(f"✅ {INDEX} preloads all {len(graph)} startup modules of {ENTRY}")
+    if args.check:
+        return 0
+
+    esbuild = find_esbuild()
+    if not esbuild:
+        print("❌ esbuild not found (PATH or ./node_modules/.bin). Install it with: npm install --no-save esbuild")
+        return 1
+
+    out = args.out.replace(os.sep, "/").rstrip("/")
+    if out.count("/") != 0:
+        print(f"⚠️  {out} is not one level below the app root; worker/corpus URLs may not resolve")
+    if os.path.isdir(args.out):
+        shutil.rmtree(args.out)
+
+    common = [esbuild, "--bundle", "--format=esm", "--log-level=warning"]
+    if not args.no_minify:
+        common += ["--minify", "--sourcemap=external"]
+    ok = run(common + [ENTRY, "--splitting", f"--outdir={out}",
+                       "--entry-names=[name]", "--chunk-names=chunks/[name]-[hash]"])
+    ok = ok and run(common + [WORKER, f"--outfile={out}/pipelineWorker.js"])
+    if not ok:
+        print("\n❌ esbuild failed; nothing else written.")
+        return 1
+
+    with open(INDEX, encoding="utf-8") as f:
+        html = f.read()
+    with open(BUNDLE_INDEX, "w", encoding="utf-8") as f:
+        f.write(bundle_index(html, out))
+
+    print()
+    for root, _, files in os.walk(args.out):
+        for name in sorted(files):
+            if name.endswith(".js"):
+                path = os.path.join(root, name)
+                print(f"📦 {path.replace(os.sep, '/')}: {os.path.getsize(path) / 1024:.1f} KiB")
+    print(f"\nWrote {args.out}/ + {BUNDLE_INDEX} (serve it from the app root, like {INDEX})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Corpus Compiler - Lemonade Self-Service Portal
+
+Validates the hand-edited corpora in corpus/*.json and compiles them into
+pre-merged, sharded bundles that src/corpus.js can load piecemeal:
+
+  - preferred/banned lexicons are merged with corpus/lexicon_global.json and
+    deduped ahead of time (same rules as corpus.js: trim, drop empties, keep order)
+  - examples are sharded by uiContext / audience / locale (whichever the corpus uses)
+  - corpus/dist/manifest.json lists every corpus, its merged lexicons, and its
+    shards with keys, counts and content hashes (hashes are also in the filenames,
+    so shards can be cached forever)
+
+corpus.js reads the manifest when present and fetches only the shard(s) matching
+the request params; without a manifest it falls back to the raw corpus files.
+corpus/dist/ is build output — rebuild after editing any corpus.
+
+Usage:
+    python build_corpus.py               # corpus/*.json -> corpus/dist/
+    python build_corpus.py --check       # validate only, write nothing
+    python build_corpus.py --src corpus --out corpus/dist
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+GLOBAL_LEXICON = "lexicon_global.json"
+SHARD_FIELDS = ["uiContext", "audience", "locale"]
+MANIFEST_VERSION = 1
+
+
+def canonical(obj):
+    """Stable JSON encoding used for hashing and for the emitted files."""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def content_hash(obj):
+    return hashlib.sha256(canonical(obj).encode("utf-8")).hexdigest()
+
+
+def dedupe(items):
+    """Mirror of corpus.js dedupe(): trim, drop empties, keep first occurrence."""
+    seen, out = set(), []
+    for s in items:
+        s = str(s).strip()
+        if s and s not in seen:
+            seen.add(s)
+            out.append(s)
+    return out
+
+
+def norm(v):
+    """Mirror of corpus.js norm() so shard keys match request params."""
+    return str(v or "").lower().strip()
+
+
+def validate_corpus(path, data):
+    """Return (errors, warnings) for one corpus file."""
+    errors, warnings = [], []
+    if not isinstance(data, dict):
+        return [f"{path}: top level must be an object"], warnings
+
+    if not isinstance(data.get("content_type"), str) or not data["content_type"].strip():
+        errors.append(f"{path}: missing content_type")
+
+    for key in ("preferred_lexicon", "banned_lexicon", "banned_phrases"):
+        if key in data and not (isinstance(data[key], list) and all(isinstance(x, str) for x in data[key])):
+            errors.append(f"{path}: {key} must be a list of strings")
+
+    examples = data.get("examples")
+    if not isinstance(examples, list):
+        errors.append(f"{path}: examples must be a list")
+        return errors, warnings
+
+    ids = set()
+    for i, e in enumerate(examples):
+        where = f"{path}: examples[{i}]"
+        if not isinstance(e, dict):
+            errors.append(f"{where} must be an object")
+            continue
+        eid = e.get("id")
+        if not isinstance(eid, str) or not eid.strip():
+            errors.append(f"{where} missing id")
+        elif eid in ids:
+            errors.append(f"{where} duplicate id {eid!r}")
+        else:
+            ids.add(eid)
+        if not isinstance(e.get("text"), str) or not e["text"].strip():
+            errors.append(f"{where} ({eid}) missing text")
+        for f in SHARD_FIELDS:
+            if f in e and not isinstance(e[f], str):
+                errors.append(f"{where} ({eid}) {f} must be a string")
+
+    lex = data.get("preferred_lexicon", [])
+    if isinstance(lex, list) and len(dedupe(lex)) != len(lex):
+        warnings.append(f"{path}: preferred_lexicon has duplicates (deduped in output)")
+    return errors, warnings
+
+
+def validate_global(path, data):
+    errors = []
+    if not isinstance(data, dict):
+        return [f"{path}: top level must be an object"]
+    for key in ("preferred", "banned"):
+        if key in data and not (isinstance(data[key], list) and all(isinstance(x, str) for x in data[key])):
+            errors.append(f"{path}: {key} must be a list of strings")
+    return errors
+
+
+def shard_fields_for(examples):
+    """Shard on the SHARD_FIELDS this corpus actually uses."""
+    return [f for f in SHARD_FIELDS if any(isinstance(e, dict) and e.get(f) for e in examples)]
+
+
+def shard_examples(examples, fields):
+    """Group examples by their normalized values of `fields`, preserving order."""
+    shards = {}
+    for e in examples:
+        key = tuple(norm(e.get(f)) for f in fields)
+        shards.setdefault(key, []).append(e)
+    return shards
+
+
+def shard_name(key):
+    parts = [p or "any" for p in key] or ["all"]
+    return "__".join("".join(c if c.isalnum() or c in "-_" else "-" for c in p) for p in parts)
+
+
+def compile_corpus(rel_path, data, global_lex, out_dir, url_prefix):
+    examples = data.get("examples", [])
+    preferred = dedupe([*(data.get("preferred_lexicon") or []), *(global_lex.get("preferred") or [])])
+    banned = dedupe([
+        *(data.get("banned_phrases") or data.get("banned_lexicon") or []),
+        *(global_lex.get("banned") or []),
+    ])
+
+    fields = shard_fields_for(examples)
+    ctype = data["content_type"]
+    stem = os.path.splitext(os.path.basename(rel_path))[0]
+    shards_out = []
+    for key, items in shard_examples(examples, fields).items():
+        payload = {"content_type": ctype, "examples": items}
+        digest = content_hash(payload)
+        fname = f"{shard_name(key)}.{digest[:12]}.json"
+        shards_out.append({
+            "key": dict(zip(fields, key)),
+            "file": f"{url_prefix}/{stem}/{fname}",
+            "count": len(items),
+            "hash": digest,
+            "_payload": payload,
+            "_path": os.path.join(out_dir, stem, fname),
+        })
+
+    entry = {
+        "content_type": ctype,
+        "source_hash": content_hash(data),
+        "example_count": len(examples),
+        "shard_by": fields,
+        "preferred_lexicon": preferred,
+        "banned_lexicon": banned,
+        "shards": shards_out,
+    }
+    return entry
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Validate and compile corpus/*.json into sharded bundles")
+    ap.add_argument("--src", default="corpus", help="directory with the hand-edited corpora")
+    ap.add_argument("--out", default=os.path.join("corpus", "dist"), help="output directory")
+    ap.add_argument("--check", action="store_true", help="validate only")
+    args = ap.parse_args()
+
+    global_path = os.path.join(args.src, GLOBAL_LEXICON)
+    try:
+        with open(global_path, encoding="utf-8") as f:
+            global_lex = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ Cannot read {global_path}: {e}")
+        return 1
+
+    errors = validate_global(global_path, global_lex)
+    warnings = []
+    corpora = {}
+    for path in sorted(glob.glob(os.path.join(args.src, "*.json"))):
+        if os.path.basename(path) == GLOBAL_LEXICON:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            errors.append(f"{path}: {e}")
+            continue
+        errs, warns = validate_corpus(path, data)
+        errors.extend(errs)
+        warnings.extend(warns)
+        corpora[path] = data
+
+    for w in warnings:
+        print(f"⚠️  {w}")
+    if errors:
+        for e in errors:
+            print(f"❌ {e}")
+        print(f"\n{len(errors)} error(s); nothing written.")
+        return 1
+    print(f"✅ {len(corpora)} corpora valid")
+    if args.check:
+        return 0
+
+    # manifest keys/URLs are relative to the page root (run from the repo root)
+    url_prefix = args.out.replace(os.sep, "/").rstrip("/")
+    src_prefix = args.src.replace(os.sep, "/").rstrip("/")
+    if os.path.isdir(args.out):
+        shutil.rmtree(args.out)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "global_hash": content_hash(global_lex),
+        "corpora": {},
+    }
+    written = 0
+    for path, data in corpora.items():
+        rel = f"{src_prefix}/{os.path.basename(path)}"
+        entry = compile_corpus(rel, data, global_lex, args.out, url_prefix)
+        for shard in entry["shards"]:
+            os.makedirs(os.path.dirname(shard["_path"]), exist_ok=True)
+            with open(shard.pop("_path"), "w", encoding="utf-8") as f:
+                f.write(canonical(shard.pop("_payload")))
+            written += 1
+        manifest["corpora"][rel] = entry
+        print(f"📦 {rel}: {entry['example_count']} examples → {len(entry['shards'])} shard(s) by {entry['shard_by'] or ['—']}")
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"\nWrote {written} shard(s) + manifest.json to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
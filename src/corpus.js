@@ -1,20 +1,37 @@
 // src/corpus.js — load corpora, merge global lexicon, pick refs, derive contextual anchors
+// Loads are memoized per corpus path: parsed files are kept with their ETag/Last-Modified
+// and revalidated in the background (conditional GET) every ?corpus_revalidate_ms.
+
+// When build_corpus.py output is deployed (corpus/dist/manifest.json), only the shard(s)
+// matching the request params are fetched and lexicons come pre-merged from the manifest.
+
+// Corpus paths are relative to the app root (index.html). Inside the pipeline worker
+// relative URLs would resolve against src/, so fetches are anchored to the root there.
+const APP_ROOT = typeof document === 'undefined' ? new URL('../', import.meta.url).href : null;
+function fetchUrl(p) {
+  return APP_ROOT && !/^https?:/.test(p) ? new URL(p, APP_ROOT).href : p;
+}
 
 // -------- Public API --------
-export async function loadCorpusWithLexicon(policy) {
+export async function loadCorpusWithLexicon(policy, params = {}) {
   try {
     const filePath = resolvePath(policy?.corpus?.file);
+
+    const manifest = await loadManifest();
+    const entry = manifest?.corpora?.[filePath.replace(/^\.\//, '')];
+    if (entry && Array.isArray(entry.shards)) {
+      return await loadFromShards(filePath, entry, params, policy?.corpus?.refs ?? 3);
+    }
+
     const globalPath = resolvePath('corpus/lexicon_global.json');
 
-    const [corpusRes, globalRes] = await Promise.all([
-      fetch(filePath), fetch(globalPath)
+    const [corpus, global] = await Promise.all([
+      cachedJSON(filePath, 'Corpus'), cachedJSON(globalPath, 'Global lexicon')
     ]);
 
-    if (!corpusRes.ok) throw new Error(`Corpus HTTP ${corpusRes.status}`);
-    if (!globalRes.ok) throw new Error(`Global lexicon HTTP ${globalRes.status}`);
-
-    const corpus = await corpusRes.json();
-    const global = await globalRes.json();
+    // Re-merge only when either source file actually changed
+    const memo = _merged.get(filePath);
+    if (memo && memo.corpus === corpus && memo.global === global) return memo.pack;
 
     // Expect structure:
     // corpus: { content_type, examples:[{...}], preferred_lexicon?, banned_phrases? }
@@ -28,52 +45,78 @@ export async function loadCorpusWithLexicon(policy) {
       ...(global.banned || [])
     ]);
 
-    return {
+    const pack = {
       content_type: corpus.content_type || 'unknown',
       examples: Array.isArray(corpus.examples) ? corpus.examples : [],
       preferred_lexicon,
       banned_lexicon
     };
+    _merged.set(filePath, { corpus, global, pack });
+    return pack;
   } catch (err) {
     return { error: err?.message || String(err) };
   }
 }
 
 /**
- * Pick N reference examples based on exact field matches on matchOn keys.
- * Falls back to partial/any matches if not enough.
+ * Drop memoized corpora so the next load refetches.
+ * Pass a corpus path (as in policy.corpus.file) to drop one file, or nothing for all.
+ */
+export function invalidateCorpusCache(path) {
+  if (!path) { _files.clear(); _merged.clear(); _manifestMissAt = 0; return; }
+  const url = resolvePath(path);
+  _files.delete(url);
+  _merged.delete(url);
+  // the global lexicon feeds every merged pack
+  if (url === resolvePath('corpus/lexicon_global.json')) _merged.clear();
+}
+
+/**
+ * Pick N reference examples, most relevant first.
+ * Tiers: exact match on every matchOn key > partial/any-key match > rest; within a
+ * tier, BM25 of the example text against the request params. Uses a per-pack
+ * inverted index (built once, memoized), so only matching examples are visited.
  */
 export function pickRefs(corpusPack, matchOn = [], params = {}, n = 3) {
   const ex = Array.isArray(corpusPack?.examples) ? corpusPack.examples : [];
-  if (ex.length === 0) return [];
-
-  const exact = [];
-  const partial = [];
-  const any = [];
-
-  for (const e of ex) {
-    if (!e || typeof e !== 'object') continue;
-    let exactScore = 0, partialScore = 0;
-
-    for (const key of matchOn) {
-      const want = norm(params[key]);
-      const got = norm(e[key]);
-      if (!key) continue;
-      if (want && got && want === got) exactScore++;
-      else if (want && got && (got.includes(want) || want.includes(got))) partialScore++;
-    }
+  if (ex.length === 0 || n <= 0) return [];
 
-    if (exactScore === matchOn.length && matchOn.length > 0) exact.push(e);
-    else if (exactScore > 0 || partialScore > 0) partial.push(e);
-    else any.push(e);
+  const keys = matchOn.filter(Boolean);
+  const idx = getRefIndex(corpusPack, ex, keys);
+
+  // field tiers via postings: per doc, count keys matched exactly / partially
+  const exactHits = new Map();
+  const partialHits = new Set();
+  for (const key of keys) {
+    const want = norm(params[key]);
+    const postings = idx.fields.get(key);
+    if (!want || !postings) continue;
+    for (const [got, docs] of postings) {
+      if (got === want) docs.forEach(d => exactHits.set(d, (exactHits.get(d) || 0) + 1));
+      else if (got.includes(want) || want.includes(got)) docs.forEach(d => partialHits.add(d));
+    }
   }
 
-  const out = [];
-  pushSome(out, exact, n);
-  if (out.length < n) pushSome(out, partial, n - out.length);
-  if (out.length < n) pushSome(out, any, n - out.length);
+  const relevance = bm25(idx, queryTerms(params));
+
+  const candidates = new Set([...exactHits.keys(), ...partialHits, ...relevance.keys()]);
+  const tierOf = (d) => {
+    const hits = exactHits.get(d) || 0;
+    if (keys.length > 0 && hits === keys.length) return 2;
+    return (hits > 0 || partialHits.has(d)) ? 1 : 0;
+  };
+  const ranked = [...candidates]
+    .map(d => ({ d, tier: tierOf(d), score: relevance.get(d) || 0 }))
+    .sort((a, b) => (b.tier - a.tier) || (b.score - a.score) || (a.d - b.d))
+    .slice(0, n)
+    .map(r => ex[r.d]);
 
-  return out.slice(0, n);
+  // fewer than n matched: top up with the remaining examples in corpus order
+  for (let d = 0; ranked.length < n && d < idx.docs.length; d++) {
+    const e = ex[idx.docs[d]];
+    if (!ranked.includes(e)) ranked.push(e);
+  }
+  return ranked;
 }
 
 /**
@@ -113,6 +156,133 @@ const ACTION_HINTS = new Set([
   'team','everyone','all','hands','event','meet','meeting','call','agenda','next','steps','reminder'
 ]);
 
+// -------- memoized fetch --------
+const REVALIDATE_MS = (() => {
+  try {
+    const v = Number(new URLSearchParams(location.search).get('corpus_revalidate_ms'));
+    return Number.isFinite(v) && v > 0 ? v : 60000;
+  } catch { return 60000; }
+})();
+
+const _files = new Map();  // url -> { json, etag, lastModified, checkedAt, pending }
+const _merged = new Map(); // url -> { corpus, global, pack } (source refs detect changes)
+
+async function cachedJSON(url, label) {
+  const entry = _files.get(url);
+  if (entry?.json) {
+    if (Date.now() - entry.checkedAt > REVALIDATE_MS && !entry.pending) {
+      entry.pending = revalidate(url, entry).finally(() => { entry.pending = null; });
+    }
+    return entry.json;
+  }
+  if (entry?.pending) return entry.pending;
+
+  const fresh = { json: null, etag: null, lastModified: null, checkedAt: 0, pending: null };
+  fresh.pending = (async () => {
+    const res = await fetch(fetchUrl(url));
+    if (!res.ok) throw new Error(`${label} HTTP ${res.status}`);
+    fresh.json = await res.json();
+    fresh.etag = res.headers?.get?.('etag') || null;
+    fresh.lastModified = res.headers?.get?.('last-modified') || null;
+    fresh.checkedAt = Date.now();
+    return fresh.json;
+  })();
+  _files.set(url, fresh);
+  try {
+    return await fresh.pending;
+  } catch (err) {
+    _files.delete(url); // don't memoize failures
+    throw err;
+  } finally {
+    fresh.pending = null;
+  }
+}
+
+// Conditional GET; keeps serving the old copy on 304 or on any error
+async function revalidate(url, entry) {
+  try {
+    const headers = {};
+    if (entry.etag) headers['If-None-Match'] = entry.etag;
+    if (entry.lastModified) headers['If-Modified-Since'] = entry.lastModified;
+    const res = await fetch(fetchUrl(url), { headers, cache: 'no-cache' });
+    if (res.ok && res.status !== 304) {
+      entry.json = await res.json();
+      entry.etag = res.headers?.get?.('etag') || null;
+      entry.lastModified = res.headers?.get?.('last-modified') || null;
+    }
+  } catch {}
+  entry.checkedAt = Date.now();
+}
+
+// -------- sharded bundles (build_corpus.py) --------
+const MANIFEST_PATH = './corpus/dist/manifest.json';
+let _manifestMissAt = 0; // remember a missing manifest for one revalidation window
+
+async function loadManifest() {
+  if (_manifestMissAt && Date.now() - _manifestMissAt < REVALIDATE_MS) return null;
+  try {
+    const m = await cachedJSON(MANIFEST_PATH, 'Manifest');
+    _manifestMissAt = 0;
+    return m;
+  } catch {
+    _manifestMissAt = Date.now();
+    return null;
+  }
+}
+
+// Shards whose key matches every param given: exact first, then partial (substring,
+// as in pickRefs), else the whole corpus. A narrow match can hold fewer than the `min`
+// examples pickRefs needs, so it is topped up with the closest other shards (most key
+// fields matching, then manifest order) until the manifest counts reach `min`.
+function selectShards(entry, params = {}, min = 0) {
+  const dims = Array.isArray(entry.shard_by) ? entry.shard_by : [];
+  const want = dims.map(d => norm(params?.[d]));
+  const same = (a, b) => a === b;
+  const near = (a, b) => !!a && (a.includes(b) || b.includes(a));
+  const fits = (sh, eq) => dims.every((d, i) => !want[i] || eq(norm(sh?.key?.[d]), want[i]));
+  const exact = entry.shards.filter(sh => fits(sh, same));
+  const partial = exact.length ? [] : entry.shards.filter(sh => fits(sh, near));
+  const picked = exact.length ? exact : partial;
+  if (!picked.length) return entry.shards;
+
+  const size = (list) => list.reduce((sum, sh) => sum + (Number(sh.count) || 0), 0);
+  if (size(picked) >= min) return picked;
+  const closeness = (sh) => dims.reduce((sum, d, i) => {
+    const got = norm(sh?.key?.[d]);
+    return sum + (!want[i] ? 0 : same(got, want[i]) ? 2 : near(got, want[i]) ? 1 : 0);
+  }, 0);
+  const rest = entry.shards
+    .filter(sh => !picked.includes(sh))
+    .map((sh, i) => ({ sh, i, c: closeness(sh) }))
+    .sort((a, b) => (b.c - a.c) || (a.i - b.i));
+  const out = [...picked];
+  for (const { sh } of rest) {
+    if (size(out) >= min) break;
+    out.push(sh);
+  }
+  return out;
+}
+
+async function loadFromShards(filePath, entry, params, min) {
+  const shards = selectShards(entry, params, min);
+  const files = shards.map(sh => resolvePath(sh.file));
+  const parts = await Promise.all(files.map(f => cachedJSON(f, 'Corpus shard')));
+
+  const memoKey = `${filePath}#${files.join('|')}`;
+  const memo = _merged.get(memoKey);
+  if (memo && memo.entry === entry && memo.parts.every((p, i) => p === parts[i])) return memo.pack;
+
+  const pack = {
+    content_type: entry.content_type || 'unknown',
+    examples: parts.flatMap(p => Array.isArray(p?.examples) ? p.examples : []),
+    preferred_lexicon: entry.preferred_lexicon || [],
+    banned_lexicon: entry.banned_lexicon || [],
+    shards: files
+  };
+  _merged.set(memoKey, { entry, parts, pack });
+  return pack;
+}
+
 function resolvePath(p) {
   if (!p) return './corpus/microcopy_corpus.json';
   if (p.startsWith('http') || p.startsWith('/')) return p;
@@ -170,9 +340,82 @@ function makeNgrams(tokens, n) {
   return out;
 }
 
-function pushSome(out, src, need) {
-  for (const x of src) {
-    if (out.length >= need + out.length) break;
-    if (!out.includes(x)) out.push(x);
+// -------- ref index (inverted index on matchOn fields + BM25 over example text) --------
+const BM25_K1 = 1.2;
+const BM25_B = 0.75;
+const _refIndexes = new WeakMap(); // pack -> Map(matchOnKey -> index)
+
+function getRefIndex(pack, examples, keys) {
+  let perPack = _refIndexes.get(pack);
+  if (!perPack) { perPack = new Map(); _refIndexes.set(pack, perPack); }
+  const sig = keys.join('|');
+  let idx = perPack.get(sig);
+  if (!idx) { idx = buildRefIndex(examples, keys); perPack.set(sig, idx); }
+  return idx;
+}
+
+function buildRefIndex(examples, keys) {
+  const fields = new Map(keys.map(k => [k, new Map()])); // key -> normValue -> docIds[]
+  const terms = new Map();                               // term -> [[docId, tf], ...]
+  const lengths = [];
+  const docs = [];                                       // valid doc ids, corpus order
+
+  examples.forEach((e, d) => {
+    if (!e || typeof e !== 'object') return;
+    docs.push(d);
+    for (const k of keys) {
+      const v = norm(e[k]);
+      if (!v) continue;
+      const postings = fields.get(k);
+      if (!postings.has(v)) postings.set(v, []);
+      postings.get(v).push(d);
+    }
+    const toks = docTokens(e);
+    lengths[d] = toks.length;
+    const tf = countTerms(toks);
+    for (const [t, c] of Object.entries(tf)) {
+      if (!terms.has(t)) terms.set(t, []);
+      terms.get(t).push([d, c]);
+    }
+  });
+
+  const total = docs.reduce((a, d) => a + lengths[d], 0);
+  return { fields, terms, lengths, docs, avgLen: docs.length ? total / docs.length : 0 };
+}
+
+// Everything searchable about an example except its id
+function docTokens(e) {
+  const parts = [];
+  for (const [k, v] of Object.entries(e)) {
+    if (k === 'id' || typeof v !== 'string') continue;
+    parts.push(v);
+  }
+  return tokenize(parts.join(' ').replace(/_/g, ' ')).filter(t => !STOP.has(t));
+}
+
+function queryTerms(params = {}) {
+  const parts = [];
+  for (const [k, v] of Object.entries(params || {})) {
+    if (k.startsWith('_') || typeof v !== 'string') continue;
+    parts.push(v);
+  }
+  return dedupe(tokenize(parts.join(' ').replace(/_/g, ' ')).filter(t => !STOP.has(t)));
+}
+
+// docId -> BM25 score, touching only postings of the query terms
+function bm25(idx, qTerms) {
+  const scores = new Map();
+  const N = idx.docs.length;
+  if (!N) return scores;
+  for (const t of qTerms) {
+    const postings = idx.terms.get(t);
+    if (!postings) continue;
+    const idf = Math.log(1 + (N - postings.length + 0.5) / (postings.length + 0.5));
+    for (const [d, tf] of postings) {
+      const norm = 1 - BM25_B + BM25_B * (idx.lengths[d] / (idx.avgLen || 1));
+      const s = idf * (tf * (BM25_K1 + 1)) / (tf + BM25_K1 * norm);
+      scores.set(d, (scores.get(d) || 0) + s);
+    }
   }
+  return scores;
 }
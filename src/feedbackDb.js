@@ -1,10 +1,28 @@
 // src/feedbackDb.js — IndexedDB (events, feedback) + CSV + robust reset + "recent" helpers
 // Adds: saveRun sets window.__LAST_RUN_ID so thumbs can attach feedback to the correct run.
+// KPI totals are maintained incrementally (kpi_agg/kpi_first) by saveRun/saveFeedback.
+// Raw rows past the retention window are rolled up into kpi_daily and deleted in idle time.
 
 const DB_NAME = 'lemonade_demo_v1'; // keep stable across versions
-const DB_VERSION = 1;
+const DB_VERSION = 5;       // v2: content_type indexes; v3: KPI aggregate stores; v4: daily rollups;
+                            // v5: drop feedback.content_type (feedback rows carry no type)
 const STORE_EVENTS = 'events';
 const STORE_FEEDBACK = 'feedback';
+const STORE_AGG = 'kpi_agg';       // one running-totals row (key 'kpi'), see foldEvent/foldFeedback
+const STORE_FIRST = 'kpi_first';   // first feedback action per run (North Star numerator/denominator);
+                                   // { runId, compacted: true } once the run was rolled up into kpi_daily
+const STORE_DAILY = 'kpi_daily';   // per-day totals of compacted raw rows (key 'YYYY-MM-DD', UTC)
+const AGG_KEY = 'kpi';
+
+// store -> schema. Missing stores/indexes are added on upgrade and unlisted indexes dropped;
+// existing data is kept.
+const STORES = {
+  [STORE_EVENTS]: { keyPath: 'id', autoIncrement: true, indexes: ['createdAt', 'content_type'] },
+  [STORE_FEEDBACK]: { keyPath: 'id', autoIncrement: true, indexes: ['createdAt', 'runId'] },
+  [STORE_AGG]: { keyPath: 'key', indexes: [] },
+  [STORE_FIRST]: { keyPath: 'runId', indexes: [] },
+  [STORE_DAILY]: { keyPath: 'day', indexes: [] }
+};
 
 let dbConn = null;
 
@@ -15,15 +33,19 @@ function openDb() {
     const req = indexedDB.open(DB_NAME, DB_VERSION);
     req.onupgradeneeded = () => {
       const db = req.result;
-      if (!db.objectStoreNames.contains(STORE_EVENTS)) {
-        const s = db.createObjectStore(STORE_EVENTS, { keyPath: 'id', autoIncrement: true });
-        s.createIndex('createdAt', 'createdAt', { unique: false });
-      }
-      if (!db.objectStoreNames.contains(STORE_FEEDBACK)) {
-        const s = db.createObjectStore(STORE_FEEDBACK, { keyPath: 'id', autoIncrement: true });
-        s.createIndex('runId', 'runId', { unique: false });
-        s.createIndex('createdAt', 'createdAt', { unique: false });
+      const tx = req.transaction; // versionchange tx: existing stores are migrated in place
+      for (const [name, { indexes, ...opts }] of Object.entries(STORES)) {
+        const s = db.objectStoreNames.contains(name)
+          ? tx.objectStore(name)
+          : db.createObjectStore(name, opts);
+        for (const idx of indexes) {
+          if (!s.indexNames.contains(idx)) s.createIndex(idx, idx, { unique: false });
+        }
+        for (const idx of Array.from(s.indexNames)) {
+          if (!indexes.includes(idx)) s.deleteIndex(idx);
+        }
       }
+      // kpi_agg starts empty; the first getKpiAggregates() builds it from the existing rows
     };
     req.onsuccess = () => { dbConn = req.result; resolve(dbConn); };
     req.onerror = () => reject(req.error);
@@ -39,18 +61,56 @@ function txPromise(storeName, mode, op) {
   }));
 }
 
+// Same, over several stores in one transaction: op receives { [name]: store }
+function txStores(storeNames, mode, op) {
+  return openDb().then(db => new Promise((resolve, reject) => {
+    const tx = db.transaction(storeNames, mode);
+    const stores = Object.fromEntries(storeNames.map(n => [n, tx.objectStore(n)]));
+    Promise.resolve(op(stores)).then(resolve, reject);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
 // Wraps
-function storeGetAll(store) {
+function storeGet(store, key) {
+  return new Promise((resolve, reject) => {
+    const req = store.get(key);
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+function storePut(store, value) {
+  return new Promise((resolve, reject) => {
+    const req = store.put(value);
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+function storeEach(store, fn) {
   return new Promise((resolve, reject) => {
-    const req = store.getAll();
-    req.onsuccess = () => resolve(req.result || []);
+    const req = store.openCursor();
+    req.onsuccess = () => {
+      const cur = req.result;
+      if (!cur) return resolve();
+      fn(cur.value);
+      cur.continue();
+    };
     req.onerror = () => reject(req.error);
   });
 }
-function storeAdd(store, value) {
+// Newest-first walk of the createdAt index ('prev' cursor), stopping after n rows — O(n), not O(store)
+function storeRecent(store, n) {
   return new Promise((resolve, reject) => {
-    const req = store.add(value);
-    req.onsuccess = (ev) => resolve(ev.target.result);
+    const out = [];
+    if (n <= 0) return resolve(out);
+    const req = store.index('createdAt').openCursor(null, 'prev');
+    req.onsuccess = () => {
+      const cur = req.result;
+      if (!cur) return resolve(out);
+      out.push(cur.value);
+      if (out.length >= n) return resolve(out);
+      cur.continue();
+    };
     req.onerror = () => reject(req.error);
   });
 }
@@ -62,11 +122,356 @@ function storeClear(store) {
   });
 }
 
+// ---------- Schema normalizers (shared with kpis.js) ----------
+export function normEvent(e = {}) {
+  const verdict = (e.verdict_final ?? e.verdict ?? '').toLowerCase();
+  const type = e.content_type ?? e.type ?? 'unknown';
+  const attempts = e.attempt_count ?? e.attempts ?? 1;
+  const duration = e.duration_ms ?? e.durationMs ?? e.duration ?? 0;
+  const id = e.id ?? e.runId ?? e.run_id ?? null;
+  const createdAt = e.createdAt ?? e.timestamp ?? e.time ?? '';
+  return { id, verdict, type, attempts, duration, createdAt };
+}
+export function normFeedback(f = {}) {
+  let action = f.action;
+  if (!action) { if (f.copy) action = 'copy'; else if (f.redo) action = 'redo'; }
+  const runId = f.runId ?? f.run_id ?? f.id ?? null;
+  const createdAt = f.createdAt ?? f.timestamp ?? f.time ?? '';
+  return { runId, action: String(action || '').toLowerCase(), createdAt };
+}
+
+// ---------- KPI aggregates ----------
+// Running totals kept next to the raw rows and updated in the same transaction as each write,
+// so the KPI drawer reads one row instead of rescanning history. rebuildKpiAggregates() recomputes
+// them from the raw stores if they ever drift.
+const SUM_FIELDS = ['total', 'pass', 'border', 'fail', 'durSum', 'usable', 'usableDurSum', 'usableRetried', 'fbRuns', 'fbCopy'];
+
+function emptyTotals() {
+  return {
+    total: 0, pass: 0, border: 0, fail: 0,
+    durSum: 0,                               // all runs
+    usable: 0, usableDurSum: 0, usableRetried: 0, // pass + borderline runs
+    byType: {},                              // type -> { total, pass, borderline, fail }
+    fbRuns: 0, fbCopy: 0                     // runs with feedback / whose first action was copy
+  };
+}
+function emptyAgg() { return { key: AGG_KEY, ...emptyTotals(), builtAt: null }; }
+
+function mergeTotals(into, from) {
+  for (const k of SUM_FIELDS) into[k] += from[k] || 0;
+  for (const [t, d] of Object.entries(from.byType || {})) {
+    const x = (into.byType[t] ||= { total: 0, pass: 0, borderline: 0, fail: 0 });
+    for (const k of Object.keys(x)) x[k] += d[k] || 0;
+  }
+  return into;
+}
+
+function foldEvent(agg, raw) {
+  const e = normEvent(raw);
+  agg.total++;
+  agg.durSum += e.duration || 0;
+  const t = (agg.byType[e.type || 'unknown'] ||= { total: 0, pass: 0, borderline: 0, fail: 0 });
+  t.total++;
+  if (e.verdict === 'pass') { agg.pass++; t.pass++; }
+  else if (e.verdict === 'borderline') { agg.border++; t.borderline++; }
+  else { agg.fail++; t.fail++; }
+  if (e.verdict !== 'fail') {
+    agg.usable++;
+    agg.usableDurSum += e.duration || 0;
+    if ((e.attempts || 1) > 1) agg.usableRetried++;
+  }
+  return agg;
+}
+
+// Aggregates only count feedback that names its run (normFeedback falls back to the row's own id)
+const fbRunId = (f) => f.runId ?? f.run_id ?? null;
+
+// prev: the run's current kpi_first row (or undefined). Returns the row to store, or null if unchanged.
+// A compacted run's first action is already in kpi_daily, so its later feedback is ignored.
+function foldFeedback(agg, prev, raw) {
+  const f = { ...normFeedback(raw), runId: fbRunId(raw) };
+  if (f.runId == null || !f.action || prev?.compacted) return null;
+  const key = f.createdAt || '';
+  if (!prev) {
+    agg.fbRuns++;
+    if (f.action === 'copy') agg.fbCopy++;
+    return { runId: f.runId, action: f.action, createdAt: key };
+  }
+  if (!(key && (!prev.createdAt || key < prev.createdAt))) return null;
+  agg.fbCopy += (f.action === 'copy') - (prev.action === 'copy');
+  return { runId: f.runId, action: f.action, createdAt: key };
+}
+
+// Derived KPIs, same shape kpis.js renders
+export function kpisFromAgg(a) {
+  const pct = (n, d) => d ? Math.round((n / d) * 100) : 0;
+  return {
+    total: a.total, pass: a.pass, border: a.border, fail: a.fail,
+    northStar: pct(a.fbCopy, a.fbRuns),
+    trsPassRate: pct(a.pass + a.border, a.total),
+    avgAll: a.total ? a.durSum / a.total : 0,
+    avgUsable: a.usable ? a.usableDurSum / a.usable : 0,
+    borderRetry: pct(a.usableRetried, a.usable || 1),
+    byType: a.byType
+  };
+}
+
+// Recompute kpi_agg + kpi_first from the daily rollups + raw stores in one readwrite transaction
+export async function rebuildKpiAggregates() {
+  await flushWrites();
+  return txStores([STORE_EVENTS, STORE_FEEDBACK, STORE_AGG, STORE_FIRST, STORE_DAILY], 'readwrite', async (st) => {
+    const agg = emptyAgg();
+    const first = new Map();
+    // tombstones survive the rebuild: those runs are counted in kpi_daily
+    await storeEach(st[STORE_FIRST], (r) => { if (r.compacted) first.set(r.runId, r); });
+    await storeEach(st[STORE_DAILY], (d) => mergeTotals(agg, d));
+    await storeEach(st[STORE_EVENTS], (e) => foldEvent(agg, e));
+    await storeEach(st[STORE_FEEDBACK], (f) => {
+      const runId = fbRunId(f);
+      const next = foldFeedback(agg, first.get(runId), f);
+      if (next) first.set(runId, next);
+    });
+    agg.builtAt = new Date().toISOString();
+    await storeClear(st[STORE_FIRST]);
+    await Promise.all([storePut(st[STORE_AGG], agg), ...[...first.values()].map(r => storePut(st[STORE_FIRST], r))]);
+    return agg;
+  });
+}
+
+// O(1) read of the running totals; built once from history if missing (e.g. right after the v3 upgrade)
+export async function getKpiAggregates() {
+  await flushWrites();
+  const agg = await txPromise(STORE_AGG, 'readonly', (s) => storeGet(s, AGG_KEY));
+  return agg || rebuildKpiAggregates();
+}
+
+// ---------- Retention: daily rollup + compaction ----------
+// Raw rows older than ?retention_days (default 90, 0 = keep forever) are folded into kpi_daily and
+// deleted, a page at a time in idle callbacks. kpi_agg is all-time and unaffected; rebuilds start
+// from kpi_daily. Only rows past the cutoff are deleted. A run's first action (kpi_first) is tallied
+// on its day when its row is compacted, and the kpi_first row becomes a tombstone
+// ({ runId, compacted: true }): the run's newer feedback stays in the raw store (and the CSV export)
+// but is never counted again, by the running totals or by a rebuild.
+const RETENTION_DAYS_DEFAULT = 90;
+const COMPACT_PAGE = 200;           // rows per idle step / transaction
+let _compacting = null;
+
+function retentionDays() {
+  try {
+    const v = new URLSearchParams(location.search).get('retention_days');
+    if (v == null || v === '') return RETENTION_DAYS_DEFAULT;
+    const n = Number(v);
+    return Number.isFinite(n) && n >= 0 ? n : RETENTION_DAYS_DEFAULT;
+  } catch { return RETENTION_DAYS_DEFAULT; }
+}
+
+const dayOf = (iso) => String(iso || '').slice(0, 10) || 'unknown';
+
+function idleStep() {
+  return new Promise((resolve) => {
+    if (typeof requestIdleCallback === 'function') requestIdleCallback(() => resolve(), { timeout: 10000 });
+    else setTimeout(resolve, 200);
+  });
+}
+
+// Rows in `store` (createdAt index) older than cutoff, oldest first, up to COMPACT_PAGE; deleted as read
+function takeOld(store, cutoff) {
+  return new Promise((resolve, reject) => {
+    const out = [];
+    const req = store.index('createdAt').openCursor(IDBKeyRange.upperBound(cutoff, true));
+    req.onsuccess = () => {
+      const cur = req.result;
+      if (!cur || out.length >= COMPACT_PAGE) return resolve(out);
+      out.push(cur.value);
+      cur.delete();
+      cur.continue();
+    };
+    req.onerror = () => reject(req.error);
+  });
+}
+
+// Adds fn(row) for each day bucket into kpi_daily
+async function bumpDays(dailyStore, buckets) {
+  await Promise.all([...buckets].map(async ([day, fold]) => {
+    const row = (await storeGet(dailyStore, day)) || { day, ...emptyTotals() };
+    fold(row);
+    await storePut(dailyStore, row);
+  }));
+}
+
+function compactEventsPage(cutoff) {
+  return txStores([STORE_EVENTS, STORE_DAILY], 'readwrite', async (st) => {
+    const rows = await takeOld(st[STORE_EVENTS], cutoff);
+    const byDay = new Map();
+    for (const e of rows) {
+      const day = dayOf(e.createdAt);
+      if (!byDay.has(day)) byDay.set(day, []);
+      byDay.get(day).push(e);
+    }
+    await bumpDays(st[STORE_DAILY], [...byDay].map(([day, es]) => [day, (row) => es.forEach(e => foldEvent(row, e))]));
+    return rows.length;
+  });
+}
+
+function compactFeedbackPage(cutoff) {
+  return txStores([STORE_FEEDBACK, STORE_FIRST, STORE_DAILY], 'readwrite', async (st) => {
+    const rows = await takeOld(st[STORE_FEEDBACK], cutoff);
+    const runIds = [...new Set(rows.map(fbRunId).filter(id => id != null))];
+    const firsts = await Promise.all(runIds.map(id => storeGet(st[STORE_FIRST], id)));
+    const byDay = new Map();
+    await Promise.all(runIds.map(async (runId, i) => {
+      const first = firsts[i];
+      if (first && !first.compacted) {
+        const day = dayOf(first.createdAt);
+        if (!byDay.has(day)) byDay.set(day, []);
+        byDay.get(day).push(first);
+        await storePut(st[STORE_FIRST], { runId, compacted: true });
+      }
+    }));
+    await bumpDays(st[STORE_DAILY], [...byDay].map(([day, fs]) => [day, (row) => fs.forEach(f => {
+      row.fbRuns++;
+      if (f.action === 'copy') row.fbCopy++;
+    })]));
+    return rows.length;
+  });
+}
+
+// Rolls up + deletes raw rows past the retention window, one page per idle callback.
+// Safe to call repeatedly; resolves { events, feedback } (rows compacted) or null when disabled.
+export function scheduleCompaction() {
+  const days = retentionDays();
+  if (!days) return Promise.resolve(null);
+  if (_compacting) return _compacting;
+  const cutoff = new Date(Date.now() - days * 86400000).toISOString();
+  _compacting = (async () => {
+    const stats = { events: 0, feedback: 0 };
+    await getKpiAggregates(); // kpi_first must exist before feedback is compacted
+    for (const [name, page] of [['events', compactEventsPage], ['feedback', compactFeedbackPage]]) {
+      for (;;) {
+        await idleStep();
+        await flushWrites();
+        const n = await page(cutoff);
+        stats[name] += n;
+        if (n < COMPACT_PAGE) break;
+      }
+    }
+    if (stats.events || stats.feedback) {
+      console.info(`[kpis] compacted ${stats.events} event(s), ${stats.feedback} feedback row(s) older than ${days}d`);
+    }
+    return stats;
+  })().catch((e) => {
+    console.warn('[kpis] compaction failed:', e?.message || e);
+    return null;
+  }).finally(() => { _compacting = null; });
+  return _compacting;
+}
+
+// ---------- Write-behind queue ----------
+// saveRun/saveFeedback queue their rows; the queue is written in ONE readwrite transaction per
+// tick (or as soon as WB_MAX rows are waiting), aggregates folded once per batch. Each caller's
+// promise still resolves with its row id once the batch commits. Reads flush first, so they
+// always see earlier writes. The page flushes on visibilitychange/pagehide. ?db_batch=0 writes
+// every row on its own.
+const WB_MAX = 50;
+let _wbQueue = [];                  // { store, row, resolve, reject }
+let _wbTimer = null;
+let _wbChain = Promise.resolve();   // batches commit in order
+
+function batchingDisabled() {
+  try { return new URLSearchParams(location.search).get('db_batch') === '0'; } catch { return false; }
+}
+
+function enqueueWrite(store, row) {
+  return new Promise((resolve, reject) => {
+    _wbQueue.push({ store, row, resolve, reject });
+    if (batchingDisabled() || _wbQueue.length >= WB_MAX) flushWrites();
+    else if (!_wbTimer) _wbTimer = setTimeout(flushWrites, 0);
+  });
+}
+
+// Writes whatever is queued; resolves once every batch queued so far has committed (or failed)
+export function flushWrites() {
+  if (_wbTimer) { clearTimeout(_wbTimer); _wbTimer = null; }
+  if (_wbQueue.length) {
+    const batch = _wbQueue;
+    _wbQueue = [];
+    _wbChain = _wbChain.then(() => writeBatch(batch));
+  }
+  return _wbChain;
+}
+
+async function writeBatch(batch) {
+  let db;
+  try { db = await openDb(); } catch (e) { batch.forEach(w => w.reject(e)); return; }
+  await new Promise((done) => {
+    let tx;
+    try {
+      tx = db.transaction([STORE_EVENTS, STORE_FEEDBACK, STORE_AGG, STORE_FIRST], 'readwrite');
+    } catch (e) {
+      batch.forEach(w => w.reject(e));
+      return done();
+    }
+    const ids = [], errors = [];
+
+    // a failed add only fails its own caller, not the whole batch
+    batch.forEach((w, i) => {
+      const req = tx.objectStore(w.store).add(w.row);
+      req.onsuccess = () => { ids[i] = req.result; };
+      req.onerror = (ev) => { errors[i] = req.error; ev.preventDefault?.(); ev.stopPropagation?.(); };
+    });
+
+    // requests run in order, so by the time this get succeeds every add above has settled.
+    // No aggregate row yet → leave it to the lazy rebuild, which will include these rows.
+    const aggStore = tx.objectStore(STORE_AGG), firstStore = tx.objectStore(STORE_FIRST);
+    const aggReq = aggStore.get(AGG_KEY);
+    aggReq.onsuccess = () => {
+      const agg = aggReq.result;
+      if (!agg) return;
+      const ok = batch.filter((w, i) => !errors[i]);
+      const runIds = [...new Set(ok.filter(w => w.store === STORE_FEEDBACK).map(w => fbRunId(w.row)).filter(id => id != null))];
+      const firsts = new Map(), dirty = new Set();
+      const fold = () => {
+        for (const w of ok) {
+          if (w.store === STORE_EVENTS) { foldEvent(agg, w.row); continue; }
+          const runId = fbRunId(w.row);
+          const next = foldFeedback(agg, firsts.get(runId), w.row);
+          if (next) { firsts.set(runId, next); dirty.add(runId); }
+        }
+        aggStore.put(agg);
+        dirty.forEach(id => firstStore.put(firsts.get(id)));
+      };
+      let left = runIds.length;
+      if (!left) return fold();
+      runIds.forEach(id => {
+        const g = firstStore.get(id);
+        g.onsuccess = () => { if (g.result) firsts.set(id, g.result); if (--left === 0) fold(); };
+      });
+    };
+
+    tx.oncomplete = () => {
+      batch.forEach((w, i) => (errors[i] ? w.reject(errors[i]) : w.resolve(ids[i])));
+      done();
+    };
+    tx.onabort = () => {
+      const err = tx.error || new Error('transaction aborted');
+      batch.forEach(w => w.reject(err));
+      done();
+    };
+  });
+}
+
+if (typeof document !== 'undefined') {
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushWrites();
+  });
+  try { window.addEventListener('pagehide', () => { flushWrites(); }); } catch {}
+}
+
 // ---------- Public API ----------
 export async function saveRun(event) {
   const now = new Date().toISOString();
   const e = { createdAt: now, ...event };
-  const id = await txPromise(STORE_EVENTS, 'readwrite', (s) => storeAdd(s, e));
+  const id = await enqueueWrite(STORE_EVENTS, e);
   // expose the last run id for UI/overlay to attach feedback reliably
   try { window.__LAST_RUN_ID = id; } catch {}
   return id;
@@ -75,25 +480,24 @@ export async function saveRun(event) {
 export async function saveFeedback(feedback) {
   const now = new Date().toISOString();
   const f = { createdAt: now, ...feedback };
-  return txPromise(STORE_FEEDBACK, 'readwrite', (s) => storeAdd(s, f));
+  return enqueueWrite(STORE_FEEDBACK, f);
 }
 
+// Recent-N reads walk the createdAt index backwards, so they stay flat as history grows.
+// (Rows without createdAt are not in the index and are skipped; saveRun/saveFeedback always set it.)
 export async function getRecentEvents(n = 50) {
-  const rows = await txPromise(STORE_EVENTS, 'readonly', (s) => storeGetAll(s));
-  return (Array.isArray(rows) ? rows : []).sort(
-    (a, b) => (b?.createdAt || '').localeCompare(a?.createdAt || '')
-  ).slice(0, n);
+  await flushWrites();
+  return txPromise(STORE_EVENTS, 'readonly', (s) => storeRecent(s, n));
 }
 
 export async function getRecentFeedback(n = 200) {
-  const rows = await txPromise(STORE_FEEDBACK, 'readonly', (s) => storeGetAll(s));
-  return (Array.isArray(rows) ? rows : []).sort(
-    (a, b) => (b?.createdAt || '').localeCompare(a?.createdAt || '')
-  ).slice(0, n);
+  await flushWrites();
+  return txPromise(STORE_FEEDBACK, 'readonly', (s) => storeRecent(s, n));
 }
 
 // Robust reset: try deleteDatabase; if blocked/timeout, fall back to clearing stores
 export async function resetAll() {
+  await flushWrites();
   try { if (dbConn) { dbConn.close(); dbConn = null; } } catch {}
 
   const outcome = await new Promise((resolve) => {
@@ -109,49 +513,169 @@ export async function resetAll() {
   if (outcome.ok) return outcome;
 
   const db = await openDb();
-  await Promise.allSettled([
-    new Promise((res, rej) => {
-      const tx = db.transaction(STORE_EVENTS, 'readwrite');
-      storeClear(tx.objectStore(STORE_EVENTS)).then(res, rej);
-    }),
-    new Promise((res, rej) => {
-      const tx = db.transaction(STORE_FEEDBACK, 'readwrite');
-      storeClear(tx.objectStore(STORE_FEEDBACK)).then(res, rej);
-    })
-  ]);
+  await Promise.allSettled(Object.keys(STORES).map(name => new Promise((res, rej) => {
+    const tx = db.transaction(name, 'readwrite');
+    storeClear(tx.objectStore(name)).then(res, rej);
+  })));
   return { ok: true, mode: 'cleared' };
 }
 
-// CSV export: 'events' | 'feedback'
-export async function exportCSV(which = 'events') {
+// ---------- CSV export ----------
+// Reads rows in pages (one short readonly transaction each), never the whole store at once. Two
+// passes: the first collects the column set, the second writes. With the File System Access API
+// each chunk is written as it is produced, so memory stays bounded by EXPORT_PAGE rows + one chunk.
+// Otherwise the CSV is kept as per-chunk Blobs until the download starts: no big string is built,
+// but the whole export is held (browsers may page Blob data to disk).
+const EXPORT_PAGE = 500;          // rows per transaction
+const EXPORT_CHUNK = 256 * 1024;  // chars per written chunk
+
+// One page of rows after `after` ({ key, pk } of the last row seen), in cursor order.
+// indexName null = primary key order. On an index, rows sharing the last key are skipped with
+// continuePrimaryKey, so resuming costs O(log n) even when every row has the same key (type export).
+function storePage(store, { indexName, range, after, limit }) {
+  return new Promise((resolve, reject) => {
+    const src = indexName ? store.index(indexName) : store;
+    let q = range;
+    if (after) {
+      // resume at the last key (inclusive, for index keys shared by several rows) within range
+      const hi = range?.upper, hiOpen = range?.upperOpen;
+      q = indexName
+        ? (hi === undefined ? IDBKeyRange.lowerBound(after.key) : IDBKeyRange.bound(after.key, hi, false, hiOpen))
+        : (hi === undefined ? IDBKeyRange.lowerBound(after.pk, true) : IDBKeyRange.bound(after.pk, hi, true, hiOpen));
+    }
+    const out = [];
+    let last = after;
+    let resuming = !!(after && indexName);
+    const req = src.openCursor(q);
+    req.onsuccess = () => {
+      const cur = req.result;
+      if (!cur) return resolve({ rows: out, last, done: true });
+      if (resuming) {
+        if (cur.key === after.key && cur.primaryKey < after.pk) return cur.continuePrimaryKey(after.key, after.pk);
+        if (cur.key === after.key && cur.primaryKey === after.pk) return cur.continue(); // the last row seen
+        resuming = false;
+      }
+      out.push(cur.value);
+      last = { key: cur.key, pk: cur.primaryKey };
+      if (out.length >= limit) return resolve({ rows: out, last, done: false });
+      cur.continue();
+    };
+    req.onerror = () => reject(req.error);
+  });
+}
+
+// Async iterator over pages of rows matching { from, to, type }
+async function* exportPages(which, { from, to, type } = {}) {
   const storeName = which === 'feedback' ? STORE_FEEDBACK : STORE_EVENTS;
-  const rows = await txPromise(storeName, 'readonly', (s) => storeGetAll(s));
-  if (!rows.length) {
-    alert(`No data in ${which}.`);
-    return;
+  const toIso = (d) => (d instanceof Date ? d.toISOString() : d ? String(d) : undefined);
+  const lo = toIso(from), hi = toIso(to);
+
+  // Date range → createdAt index; type only (events) → content_type index; else primary key
+  let indexName = null, range = null;
+  if (lo || hi) {
+    indexName = 'createdAt';
+    range = lo && hi ? IDBKeyRange.bound(lo, hi) : lo ? IDBKeyRange.lowerBound(lo) : IDBKeyRange.upperBound(hi);
+  } else if (type && storeName === STORE_EVENTS) {
+    indexName = 'content_type';
+    range = IDBKeyRange.only(type);
   }
-  const headers = Array.from(rows.reduce((set, r) => {
-    Object.keys(r).forEach(k => set.add(k));
-    return set;
-  }, new Set()));
 
-  const esc = (v) => {
-    const s = v == null ? '' : String(v);
-    return /[",\n]/.test(s) ? `"${s.replace(/"/g, '""')}"` : s;
+  // Feedback rows carry no type of their own: match them by their run's content_type
+  const runTypes = new Map();
+  const matches = async (rows) => {
+    if (!type) return rows;
+    if (storeName === STORE_EVENTS) return indexName === 'content_type' ? rows : rows.filter(r => normEvent(r).type === type);
+    const missing = [...new Set(rows.map(fbRunId).filter(id => id != null && !runTypes.has(id)))];
+    if (missing.length) {
+      const runs = await txPromise(STORE_EVENTS, 'readonly', (s) => Promise.all(missing.map(id => storeGet(s, id))));
+      missing.forEach((id, i) => runTypes.set(id, runs[i] ? normEvent(runs[i]).type : null));
+    }
+    return rows.filter(r => runTypes.get(fbRunId(r)) === type);
   };
-  const lines = [
-    headers.join(','),
-    ...rows.map(r => headers.map(h => esc(r[h])).join(','))
-  ];
 
-  const blob = new Blob([lines.join('\n')], { type: 'text/csv;charset=utf-8' });
+  let after = null;
+  for (;;) {
+    const page = await txPromise(storeName, 'readonly', (s) => storePage(s, { indexName, range, after, limit: EXPORT_PAGE }));
+    const rows = await matches(page.rows);
+    if (rows.length) yield rows;
+    if (page.done) return;
+    after = page.last;
+  }
+}
+
+// Opens the save-file picker (must run before the first await, while the click's user activation is fresh)
+function pickCsvFile(name) {
+  if (typeof window === 'undefined' || typeof window.showSaveFilePicker !== 'function') return null;
+  return window.showSaveFilePicker({
+    suggestedName: name,
+    types: [{ description: 'CSV', accept: { 'text/csv': ['.csv'] } }]
+  }).then(h => h.createWritable()).catch((e) => (e?.name === 'AbortError' ? 'cancelled' : null));
+}
+
+function downloadBlob(blob, name) {
   const url = URL.createObjectURL(blob);
   const a = document.createElement('a');
   a.href = url;
-  const ts = new Date().toISOString().replace(/[:.]/g, '-');
-  a.download = `${which}-${ts}.csv`;
+  a.download = name;
   document.body.appendChild(a);
   a.click();
   document.body.removeChild(a);
   URL.revokeObjectURL(url);
 }
+
+// CSV export: 'events' | 'feedback', optional { from, to, type, stream }
+//   from/to: ISO strings or Dates, inclusive, on createdAt
+//   type: content_type (feedback rows are matched through their run)
+//   stream: false to skip the file picker and always download a Blob
+export async function exportCSV(which = 'events', opts = {}) {
+  const ts = new Date().toISOString().replace(/[:.]/g, '-');
+  const name = `${which}-${ts}.csv`;
+  const picked = opts.stream === false ? null : pickCsvFile(name);
+  await flushWrites();
+
+  // pass 1: column set
+  const cols = new Set();
+  let count = 0;
+  for await (const rows of exportPages(which, opts)) {
+    count += rows.length;
+    for (const r of rows) Object.keys(r).forEach(k => cols.add(k));
+  }
+  const writable = picked ? await picked : null;
+  if (writable === 'cancelled') return { ok: false, cancelled: true };
+  if (!count) {
+    try { await writable?.abort(); } catch {}
+    alert(`No data in ${which}.`);
+    return { ok: true, rows: 0 };
+  }
+  const headers = Array.from(cols);
+
+  const esc = (v) => {
+    const s = v == null ? '' : String(v);
+    return /[",\n]/.test(s) ? `"${s.replace(/"/g, '""')}"` : s;
+  };
+
+  // pass 2: write in bounded chunks
+  const parts = [];
+  const emit = writable
+    ? (chunk) => writable.write(chunk)
+    : (chunk) => { parts.push(new Blob([chunk], { type: 'text/csv' })); };
+  let chunk = headers.join(',');
+  let written = 0;
+  try {
+    for await (const rows of exportPages(which, opts)) {
+      for (const r of rows) {
+        chunk += '\n' + headers.map(h => esc(r[h])).join(',');
+        written++;
+        if (chunk.length >= EXPORT_CHUNK) { await emit(chunk); chunk = ''; }
+      }
+    }
+    if (chunk) await emit(chunk);
+    if (writable) await writable.close();
+  } catch (e) {
+    try { await writable?.abort(); } catch {}
+    throw e;
+  }
+
+  if (!writable) downloadBlob(new Blob(parts, { type: 'text/csv;charset=utf-8' }), name);
+  return { ok: true, rows: written, mode: writable ? 'file' : 'download' };
+}
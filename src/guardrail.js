@@ -2,6 +2,7 @@
 // Robust critic: never throws; always returns a numeric score.
 // Compatible with llmClient.generateText returning { ok, text, latency_ms }.
 // Also tolerates older shapes by probing .content and raw string.
+// scoreMany() batches the critic for several candidates into one call.
 
 import { generateText } from './llmClient.js';
 
@@ -199,37 +200,51 @@ function lexiconScore(text, contentType, inputs, policy) {
 }
 
 // ---------- Critic (max 40) ----------
-async function criticScore(text, contentType, params = {}) {
-  const system =
-    `You are a rigorous writing critic for an insurance brand.\n` +
-    `Return STRICT JSON only: {"score": <0..40>, "detail": "<short>"}.\n` +
-    `No prose, no preface, no fences.`;
+const CRITIC_SYSTEM =
+  `You are a rigorous writing critic for an insurance brand.\n` +
+  `Return STRICT JSON only: {"score": <0..40>, "detail": "<short>"}.\n` +
+  `No prose, no preface, no fences.`;
 
-  let rubric;
+const CRITIC_SYSTEM_MANY =
+  `You are a rigorous writing critic for an insurance brand.\n` +
+  `You will receive several numbered candidate texts. Score each one independently.\n` +
+  `Return STRICT JSON only: an array with one entry per candidate, in order: ` +
+  `[{"i": <n>, "score": <0..40>, "detail": "<short>"}, ...].\n` +
+  `No prose, no preface, no fences.`;
+
+function criticRubric(contentType, params = {}) {
   if (contentType === "microcopy") {
     const uiContext = params?.uiContext || 'button';
     if (uiContext === 'button') {
-      rubric = `Evaluate ONLY the writing style and presentation quality. Score based on: clarity, actionability, appropriate length, professional tone. Score 0-10 for poor writing style (unclear, too long, unprofessional). Score 30-40 for excellent writing style (clear, concise, professional). Do NOT judge content validity - only evaluate how well it's written.`;
+      return `Evaluate ONLY the writing style and presentation quality. Score based on: clarity, actionability, appropriate length, professional tone. Score 0-10 for poor writing style (unclear, too long, unprofessional). Score 30-40 for excellent writing style (clear, concise, professional). Do NOT judge content validity - only evaluate how well it's written.`;
     } else if (uiContext === 'error') {
-      rubric = `Evaluate ONLY the writing style and presentation quality. Score based on: empathy, helpfulness, clarity, appropriate length. Score 0-10 for poor writing style (unclear, too long, not empathetic). Score 30-40 for excellent writing style (clear, empathetic, helpful). Do NOT judge content validity - only evaluate how well it's written.`;
+      return `Evaluate ONLY the writing style and presentation quality. Score based on: empathy, helpfulness, clarity, appropriate length. Score 0-10 for poor writing style (unclear, too long, not empathetic). Score 30-40 for excellent writing style (clear, empathetic, helpful). Do NOT judge content validity - only evaluate how well it's written.`;
     } else if (uiContext === 'tooltip') {
-      rubric = `Evaluate ONLY the writing style and presentation quality. Score based on: helpfulness, clarity, conciseness, appropriate length. Score 0-10 for poor writing style (unclear, too long, not helpful). Score 30-40 for excellent writing style (clear, helpful, concise). Do NOT judge content validity - only evaluate how well it's written.`;
-    } else {
-      rubric = `Evaluate ONLY the writing style and presentation quality. Score based on: clarity, actionability, appropriate length, professional tone. Score 0-10 for poor writing style (unclear, too long, unprofessional). Score 30-40 for excellent writing style (clear, concise, professional). Do NOT judge content validity - only evaluate how well it's written.`;
+      return `Evaluate ONLY the writing style and presentation quality. Score based on: helpfulness, clarity, conciseness, appropriate length. Score 0-10 for poor writing style (unclear, too long, not helpful). Score 30-40 for excellent writing style (clear, helpful, concise). Do NOT judge content validity - only evaluate how well it's written.`;
     }
-  } else if (contentType === "internal_comms") {
-    rubric = `Evaluate ONLY the writing style and presentation quality. Score based on: professional tone, clear structure, appropriate formatting, brand voice consistency. Score 0-10 for poor writing style (unclear, unprofessional tone, bad formatting). Score 30-40 for excellent writing style (clear, professional, well-structured). Do NOT judge content validity or business appropriateness - only evaluate how well it's written and presented.`;
-  } else if (contentType === "press_release") {
-    rubric = `Evaluate ONLY the writing style and presentation quality. Score based on: professional tone, clear structure, appropriate formatting, brand voice consistency. Score 0-10 for poor writing style (unclear, unprofessional tone, bad formatting). Score 30-40 for excellent writing style (clear, professional, well-structured). Do NOT judge content validity or business appropriateness - only evaluate how well it's written and presented.`;
-  } else {
-    rubric = `Evaluate ONLY the writing style and presentation quality. Score based on: professional tone, clear structure, appropriate formatting. Score 0-10 for poor writing style (unclear, unprofessional tone, bad formatting). Score 30-40 for excellent writing style (clear, professional, well-structured). Do NOT judge content validity - only evaluate how well it's written.`;
+    return `Evaluate ONLY the writing style and presentation quality. Score based on: clarity, actionability, appropriate length, professional tone. Score 0-10 for poor writing style (unclear, too long, unprofessional). Score 30-40 for excellent writing style (clear, concise, professional). Do NOT judge content validity - only evaluate how well it's written.`;
   }
+  if (contentType === "internal_comms") {
+    return `Evaluate ONLY the writing style and presentation quality. Score based on: professional tone, clear structure, appropriate formatting, brand voice consistency. Score 0-10 for poor writing style (unclear, unprofessional tone, bad formatting). Score 30-40 for excellent writing style (clear, professional, well-structured). Do NOT judge content validity or business appropriateness - only evaluate how well it's written and presented.`;
+  }
+  if (contentType === "press_release") {
+    return `Evaluate ONLY the writing style and presentation quality. Score based on: professional tone, clear structure, appropriate formatting, brand voice consistency. Score 0-10 for poor writing style (unclear, unprofessional tone, bad formatting). Score 30-40 for excellent writing style (clear, professional, well-structured). Do NOT judge content validity or business appropriateness - only evaluate how well it's written and presented.`;
+  }
+  return `Evaluate ONLY the writing style and presentation quality. Score based on: professional tone, clear structure, appropriate formatting. Score 0-10 for poor writing style (unclear, unprofessional tone, bad formatting). Score 30-40 for excellent writing style (clear, professional, well-structured). Do NOT judge content validity - only evaluate how well it's written.`;
+}
 
+// opts.meter (optional) is the orchestrator's call/usage recorder: meter.record(kind, res)
+// opts.signal (optional) cancels the critic call; the result is then flagged `aborted`
+async function criticScore(text, contentType, params = {}, { meter, signal } = {}) {
+  const system = CRITIC_SYSTEM;
+  const rubric = criticRubric(contentType, params);
   const user = `TYPE: ${contentType}\nTEXT:\n${text}\n\nRUBRIC: ${rubric}\nOUTPUT: {"score": <0..40>, "detail": "…"}`;
 
   // Preferred interface: object template -> { ok, text, ... }
   try {
-    const res = await generateText({ system, user, max_tokens: 80, temperature: 0 });
+    const res = await generateText({ system, user, max_tokens: 80, temperature: 0, signal, lane: 'critic' });
+    meter?.record('critic', res);
+    if (res?.aborted) return { score: 12, detail: "critic_aborted", ok: false, aborted: true };
     const parsed = safeParseCritic(res?.text ?? res?.content ?? res);
     return { score: parsed.score, detail: parsed.detail, ok: true };
   } catch (_e1) {
@@ -243,6 +258,7 @@ async function criticScore(text, contentType, params = {}) {
       { role: "user", content: user }
     ];
     const res2 = await generateText(messages, 80);
+    meter?.record('critic', res2);
     const parsed2 = safeParseCritic(res2?.text ?? res2?.content ?? res2);
     return { score: parsed2.score, detail: parsed2.detail, ok: true };
   } catch (_e2) {
@@ -251,6 +267,44 @@ async function criticScore(text, contentType, params = {}) {
   }
 }
 
+// Batched critic: one call for N candidates. Items the batch reply doesn't
+// cover (bad JSON, short array) are re-scored one by one. If the call itself
+// fails (error reply, open circuit, 429, abort, throw) every candidate gets the
+// conservative default instead — retrying N times would only multiply the failure.
+async function criticScoreMany(texts, contentType, params = {}, opts = {}) {
+  const list = Array.isArray(texts) ? texts : [];
+  if (list.length === 0) return [];
+  if (list.length === 1) return [await criticScore(list[0], contentType, params, opts)];
+
+  const rubric = criticRubric(contentType, params);
+  const blocks = list.map((t, i) => `CANDIDATE ${i + 1}:\n${t}`).join('\n\n');
+  const user =
+    `TYPE: ${contentType}\n${blocks}\n\nRUBRIC: ${rubric}\n` +
+    `OUTPUT: [${list.map((_, i) => `{"i": ${i + 1}, "score": <0..40>, "detail": "…"}`).join(', ')}]`;
+
+  let parsed;
+  try {
+    const res = await generateText({
+      system: CRITIC_SYSTEM_MANY,
+      user,
+      max_tokens: 24 + 56 * list.length,
+      temperature: 0,
+      signal: opts.signal,
+      lane: 'critic'
+    });
+    opts.meter?.record('critic', res);
+    if (res?.aborted) return list.map(() => ({ score: 12, detail: "critic_aborted", ok: false, aborted: true }));
+    if (res?.ok === false) return list.map(() => ({ score: 12, detail: "critic_call_error", ok: false }));
+    parsed = safeParseCriticMany(res?.text ?? res?.content ?? res, list.length);
+  } catch {
+    return list.map(() => ({ score: 12, detail: "critic_call_error", ok: false }));
+  }
+
+  return Promise.all(list.map((t, i) => parsed[i]
+    ? { score: parsed[i].score, detail: parsed[i].detail, ok: true }
+    : criticScore(t, contentType, params, opts)));
+}
+
 function safeParseCritic(raw) {
   let txt = String(raw || "").trim();
   // strip possible fences
@@ -275,6 +329,52 @@ function safeParseCritic(raw) {
   return { score: 12, detail: "critic_json_parse_error" };
 }
 
+// Returns an array of length n; entries are { score, detail } or null when
+// that candidate could not be recovered from the batch reply.
+function safeParseCriticMany(raw, n) {
+  const out = new Array(n).fill(null);
+  let txt = String(raw || "").trim();
+  txt = txt.replace(/```json/gi, "").replace(/```/g, "").trim();
+
+  const take = (obj, pos) => {
+    if (!obj || typeof obj !== "object") return;
+    const idx = Number.isFinite(Number(obj.i)) ? Number(obj.i) - 1 : pos;
+    if (idx < 0 || idx >= n || out[idx]) return;
+    const num = Number(obj.score);
+    if (!Number.isFinite(num)) return;
+    out[idx] = {
+      score: clamp(Math.round(num), 0, 40),
+      detail: typeof obj.detail === "string" ? obj.detail : ""
+    };
+  };
+
+  // try strict JSON (bare array, or wrapped as {"scores": [...]})
+  try {
+    const obj = JSON.parse(txt);
+    const arr = Array.isArray(obj) ? obj : (Array.isArray(obj?.scores) ? obj.scores : null);
+    if (arr) {
+      arr.forEach((item, pos) => {
+        if (typeof item === "number") take({ score: item }, pos);
+        else take(item, pos);
+      });
+      return out;
+    }
+  } catch {}
+
+  // object-by-object fallback: parse each {...} on its own
+  const objs = txt.match(/\{[^{}]*\}/g) || [];
+  objs.forEach((chunk, pos) => {
+    try { take(JSON.parse(chunk), pos); return; } catch {}
+    const p = safeParseCritic(chunk);
+    if (p.detail !== "critic_json_parse_error") {
+      const im = chunk.match(/"i"\s*:\s*(\d+)/);
+      take({ i: im ? Number(im[1]) : undefined, score: p.score, detail: "critic_json_parse_fallback" }, pos);
+    }
+  });
+
+  return out;
+}
+
 // ---------- Public API ----------
 /**
  * Accepts both old and new argument shapes.
@@ -289,7 +389,7 @@ export async function score(args = {}) {
 
   const rules  = rulesScore(text, contentType, inputs, policy);
   const lexicon= lexiconScore(text, contentType, inputs, policy);
-  const critic = await criticScore(text, contentType, inputs);
+  const critic = await criticScore(text, contentType, inputs, { meter: args.meter, signal: args.signal });
 
   const trs = clamp(Math.round(rules + lexicon + critic.score), 0, 100);
   const verdict = trs >= PASS ? "pass" : (trs >= BORDER ? "borderline" : "fail");
@@ -298,6 +398,7 @@ export async function score(args = {}) {
     ok: true,
     trs,
     verdict,
+    ...(critic.aborted ? { aborted: true } : {}),
     breakdown: {
       rules:   { score: rules,        max: 40 },
       lexicon: { score: lexicon,      max: 20 },
@@ -305,3 +406,46 @@ export async function score(args = {}) {
     }
   };
 }
+
+/**
+ * Score several candidates for the same request with one critic call.
+ *   scoreMany({ texts, type, params, policy }) -> Array<score() result>
+ * Rules and lexicon stay local and per-candidate; only the critic is batched.
+ * Keyword matches go on each result (`semanticMatches`) rather than on the shared inputs.
+ */
+export async function scoreMany(args = {}) {
+  const texts       = Array.isArray(args.texts) ? args.texts.map(t => t ?? "") : [];
+  const contentType = args.contentType ?? args.type ?? "";
+  const inputs      = args.inputs ?? args.params ?? {};
+  const policy      = args.policy ?? {};
+
+  if (texts.length <= 1) {
+    return texts.length ? [await score({ ...args, text: texts[0] })] : [];
+  }
+
+  const critics = await criticScoreMany(texts, contentType, inputs, { meter: args.meter, signal: args.signal });
+
+  return texts.map((text, i) => {
+    // rulesScore records keyword matches on its inputs; keep them per candidate
+    const own    = { ...inputs, _semanticMatches: undefined };
+    const rules  = rulesScore(text, contentType, own, policy);
+    const lexicon= lexiconScore(text, contentType, inputs, policy);
+    const critic = critics[i] || { score: 12, detail: "critic_call_error" };
+
+    const trs = clamp(Math.round(rules + lexicon + critic.score), 0, 100);
+    const verdict = trs >= PASS ? "pass" : (trs >= BORDER ? "borderline" : "fail");
+
+    return {
+      ok: true,
+      trs,
+      verdict,
+      ...(critic.aborted ? { aborted: true } : {}),
+      ...(own._semanticMatches ? { semanticMatches: own._semanticMatches } : {}),
+      breakdown: {
+        rules:   { score: rules,        max: 40 },
+        lexicon: { score: lexicon,      max: 20 },
+        critic:  { score: critic.score, max: 40, detail: critic.detail }
+      }
+    };
+  });
+}
@@ -3,32 +3,18 @@
 // - Downvote shows a popover near the FAB
 // - Auto-resize <textarea> results so the page scrolls, not the textarea
 
-import { getRecentEvents, getRecentFeedback, exportCSV, resetAll, saveFeedback } from './feedbackDb.js';
+import {
+  getRecentEvents, getRecentFeedback, exportCSV, resetAll, saveFeedback,
+  getKpiAggregates, rebuildKpiAggregates, kpisFromAgg, normEvent, normFeedback, scheduleCompaction
+} from './feedbackDb.js';
 
 const fmtPct = (n) => `${n}%`;
 const avg = (arr) => arr.length ? arr.reduce((a,b)=>a+b,0)/arr.length : 0;
 const pct = (n,d) => d ? Math.round((n/d)*100) : 0;
 const fmtS = (ms) => (ms/1000).toFixed(1)+'s';
 
-// ---------- Schema normalizers ----------
-function normEvent(e = {}) {
-  const verdict = (e.verdict_final ?? e.verdict ?? '').toLowerCase();
-  const type = e.content_type ?? e.type ?? 'unknown';
-  const attempts = e.attempt_count ?? e.attempts ?? 1;
-  const duration = e.duration_ms ?? e.durationMs ?? e.duration ?? 0;
-  const id = e.id ?? e.runId ?? e.run_id ?? null;
-  const createdAt = e.createdAt ?? e.timestamp ?? e.time ?? '';
-  return { id, verdict, type, attempts, duration, createdAt };
-}
-function normFeedback(f = {}) {
-  let action = f.action;
-  if (!action) { if (f.copy) action = 'copy'; else if (f.redo) action = 'redo'; }
-  const runId = f.runId ?? f.run_id ?? f.id ?? null;
-  const createdAt = f.createdAt ?? f.timestamp ?? f.time ?? '';
-  return { runId, action: String(action || '').toLowerCase(), createdAt };
-}
-
 // ---------- Metrics compute (first-action North Star) ----------
+// Row-scan fallback over a recent window, used only if the aggregate store can't be read.
 function compute(eventsRaw, feedbackRaw){
   const events = eventsRaw.map(normEvent);
 
@@ -77,9 +63,24 @@ function compute(eventsRaw, feedbackRaw){
 function setMulti(ids, text) { ids.forEach(id => { const el = document.getElementById(id); if (el) el.textContent = text; }); }
 
 // ---------- Public API ----------
+async function loadKpis() {
+  try {
+    return kpisFromAgg(await getKpiAggregates());
+  } catch (e) {
+    console.warn('[kpis] aggregates unavailable, scanning recent rows:', e?.message || e);
+    const [events, feedback] = await Promise.all([ getRecentEvents(200), getRecentFeedback(400) ]);
+    return compute(events, feedback);
+  }
+}
+
+// Recompute the running totals from the raw stores (also: ?kpi_rebuild=1 on load)
+export async function rebuildKpis() {
+  await rebuildKpiAggregates();
+  await refreshKpiPanel();
+}
+
 export async function refreshKpiPanel(){
-  const [events, feedback] = await Promise.all([ getRecentEvents(200), getRecentFeedback(400) ]);
-  const k = compute(events, feedback);
+  const k = await loadKpis();
 
   setMulti(['kpi-north-star','kpi-northstar'], fmtPct(k.northStar));
   setMulti(['kpi-trs-pass','kpi-passrate'], fmtPct(k.trsPassRate));
@@ -102,6 +103,11 @@ export async function refreshKpiPanel(){
   }
 
   wireExportsAndReset();
+  prepareResultArea();
+}
+
+// Feedback FAB + auto-sized result textarea; main.js calls this when the result card is shown
+export function prepareResultArea() {
   ensureThumbFab();        // non-blocking feedback UI
   autoResizeResultArea();  // expand textareas so page scrolls
 }
@@ -112,9 +118,10 @@ function wireExportsAndReset() {
     if (btn && !btn.__WIRED__) { btn.addEventListener('click', handler); btn.__WIRED__ = true; }
   };
 
-  // CSV exports
-  wireOnce('export-events', () => exportCSV('events'));
-  wireOnce('export-feedback', () => exportCSV('feedback'));
+  // CSV exports (streamed; filtered by the optional date/type controls)
+  const run = (which) => exportCSV(which, exportFilters()).catch(e => alert('Export failed: ' + (e?.message || e)));
+  wireOnce('export-events', () => run('events'));
+  wireOnce('export-feedback', () => run('feedback'));
 
   // Reset button creation
   const exportBtn = document.getElementById('export-events');
@@ -150,6 +157,18 @@ function wireExportsAndReset() {
   }
 }
 
+// <input type=date> values are local days; widen to the whole day in UTC ISO, as createdAt is stored
+function exportFilters() {
+  const val = (id) => document.getElementById(id)?.value || '';
+  const day = (v, end) => {
+    if (!v) return undefined;
+    const d = new Date(`${v}T00:00:00`);
+    if (end) { d.setDate(d.getDate() + 1); d.setMilliseconds(-1); }
+    return isNaN(d) ? undefined : d.toISOString();
+  };
+  return { from: day(val('export-from')), to: day(val('export-to'), true), type: val('export-type') || undefined };
+}
+
 function setBoardCleared(isResetting) {
   const loading = isResetting ? 'Resetting…' : '—';
   setMulti(['kpi-north-star','kpi-northstar'], loading);
@@ -393,7 +412,14 @@ function ensureThumbFab() {
   }, 400);
 }
 
-// Populate once on load
-document.addEventListener('DOMContentLoaded', () => {
-  setTimeout(() => { refreshKpiPanel().catch(()=>{}); }, 300);
-});
+// Populate once on load (or right away when loaded lazily by main.js after DOMContentLoaded)
+function onLoad() {
+  let rebuild = false;
+  try { rebuild = new URLSearchParams(location.search).get('kpi_rebuild') === '1'; } catch {}
+  setTimeout(() => {
+    (rebuild ? rebuildKpis() : refreshKpiPanel()).catch(()=>{})
+      .then(() => scheduleCompaction()); // retention rollup, in idle time
+  }, 300);
+}
+if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', onLoad);
+else onLoad();
@@ -1,6 +1,19 @@
 // src/llmClient.js
-// OpenAI-compatible client (Cloudflare Worker → Groq) with built-in throttling & 429 retry.
-// Returns: { ok, text, latency_ms, error }
+// OpenAI-compatible client (Cloudflare Worker → Groq) with a token-bucket limiter (RPM + TPM,
+// bounded concurrency), jittered exponential backoff on 429/503, and a response cache (in-memory LRU backed by IndexedDB; ?cache=off to bypass).
+// Optional SSE streaming (?stream=1 or { stream: true }) with onToken + early-stop predicate.
+// Identical in-flight requests share one fetch (single-flight; temperature 0 unless opted in).
+// { lane: 'critic' } routes through a separate endpoint/model/limiter when ?critic_* is configured.
+// Pass { signal } (AbortSignal) to cancel: queued slots, backoff waits and the fetch itself all stop.
+// ?endpoints=urlA@modelA*2,urlB spreads load over several workers/keys (EWMA latency × outstanding,
+// penalized by error rate; 429'd endpoints cool down) and fails over between them.
+// Each upstream has a circuit breaker (closed → open → half-open) over a rolling error/429 window;
+// with every circuit open, calls fail fast with { circuit_open: true, retry_in_ms } (?breaker=off disables).
+// Optional hedging (?hedge=1): a non-streamed request still pending past the observed p90 for its
+// max_tokens class fires one duplicate; first success wins, the other is cancelled.
+// Returns: { ok, text, latency_ms, error, usage, cached?, coalesced?, ttft_ms?, stopped_early?, aborted?, hedged?,
+//            circuit_open?, retry_in_ms? }
+//   usage = { prompt_tokens, completion_tokens, total_tokens, estimated? } (zeros for cache hits)
 
 const DEFAULT_BASE = 'https://lemonade-portal-api.selfportal.workers.dev';
 const DEFAULT_MODEL = 'llama-3.1-8b-instant';
@@ -13,8 +26,8 @@ function getParam(name) {
     return v && v.trim() ? v.trim() : null;
   } catch { return null; }
 }
-function resolveEndpoint() {
-  const override = (getParam('endpoint') || DEFAULT_BASE || '').replace(/\/+$/,'');
+function chatUrl(base) {
+  const override = String(base || '').replace(/\/+$/,'');
   if (!override) return '';
   if (/\/v1(?:\/chat\/completions)?$/.test(override)) {
     return /\/chat\/completions$/.test(override) ? override : `${override}/chat/completions`;
@@ -34,49 +47,716 @@ function extractText(json) {
   return '';
 }
 
-// --- Lightweight throttle: one request every MIN_INTERVAL_MS ---
-const MIN_INTERVAL_MS = Number(getParam('min_interval_ms') || 900); // tune if needed
-let _nextAvailableAt = 0;
-async function throttle() {
-  const wait = Math.max(0, _nextAvailableAt - nowMs());
-  if (wait > 0) await new Promise(r => setTimeout(r, wait));
-  _nextAvailableAt = nowMs() + MIN_INTERVAL_MS;
+// --- Token-bucket limiter: request + estimated-token budgets, bounded concurrency ---
+// ?min_interval_ms keeps its meaning as the sustained request spacing (→ RPM).
+// ?burst lets short runs go out back-to-back; ?tpm=0 (default) disables the token budget.
+// Each lane (see below) owns one limiter, so critic calls don't queue behind generations.
+const MAX_RETRIES = Math.max(0, Number(getParam('retries') ?? 3));
+const BACKOFF_BASE_MS = 1000;
+const BACKOFF_MAX_MS = 20000;
+
+// perMinute = Infinity (?min_interval_ms=0) means no rate limit: the bucket is always full
+function makeBucket(capacity, perMinute) {
+  return { capacity, rate: perMinute / 60000, level: capacity, at: nowMs() };
+}
+function refill(b) {
+  const t = nowMs();
+  // guard the unlimited case explicitly: 0 ms elapsed × Infinity is NaN, which would stall the queue
+  b.level = Number.isFinite(b.rate) ? Math.min(b.capacity, b.level + (t - b.at) * b.rate) : b.capacity;
+  b.at = t;
+}
+// ms until the bucket holds `need`, or 0 if it already does
+function waitFor(b, need) {
+  refill(b);
+  if (b.level >= need) return 0;
+  return b.rate > 0 ? Math.ceil((need - b.level) / b.rate) : Infinity;
+}
+
+function makeLimiter({ minIntervalMs, burst, tpm, concurrency }) {
+  const rpm = minIntervalMs > 0 ? 60000 / minIntervalMs : Infinity;
+  return {
+    minIntervalMs, rpm, burst, tpm, concurrency,
+    req: makeBucket(burst, rpm),
+    tok: tpm > 0 ? makeBucket(tpm, tpm) : null,
+    queue: [],          // FIFO of { cost, resolve, onAbort? }
+    inFlight: 0,
+    pausedUntil: 0,     // set by 429s so every caller backs off, not just the one that hit it
+    timer: null,
+  };
+}
+
+function pump(lim) {
+  if (lim.timer) { clearTimeout(lim.timer); lim.timer = null; }
+  while (lim.queue.length && lim.inFlight < lim.concurrency) {
+    const head = lim.queue[0];
+    const cost = lim.tok ? Math.min(head.cost, lim.tok.capacity) : 0;
+    const wait = Math.max(
+      lim.pausedUntil - nowMs(),
+      waitFor(lim.req, 1),
+      lim.tok ? waitFor(lim.tok, cost) : 0
+    );
+    if (wait > 0) {
+      if (Number.isFinite(wait)) lim.timer = setTimeout(() => pump(lim), wait);
+      return;
+    }
+    lim.req.level -= 1;
+    if (lim.tok) lim.tok.level -= cost;
+    lim.queue.shift();
+    if (head.onAbort) head.signal.removeEventListener('abort', head.onAbort);
+    lim.inFlight++;
+    let released = false;
+    head.resolve(() => {
+      if (released) return;
+      released = true;
+      lim.inFlight--;
+      pump(lim);
+    });
+  }
+}
+
+// Resolves with a release() callback once a request slot and the token budget are available.
+// Rejects (and leaves the queue) if `signal` aborts while waiting.
+function acquireSlot(lim, cost, signal) {
+  return new Promise((resolve, reject) => {
+    if (signal?.aborted) return reject(abortError(signal));
+    const item = { cost, resolve };
+    if (signal) {
+      item.signal = signal;
+      item.onAbort = () => {
+        const i = lim.queue.indexOf(item);
+        if (i >= 0) lim.queue.splice(i, 1);
+        reject(abortError(signal));
+        pump(lim);
+      };
+      signal.addEventListener('abort', item.onAbort, { once: true });
+    }
+    lim.queue.push(item);
+    pump(lim);
+  });
+}
+
+// --- Upstreams: weighted endpoint/model pool with health tracking and failover ---
+// ?endpoints=https://a.example@llama-3.1-8b-instant*2,https://b.example
+//   entry = url[@model][*weight]; model defaults to ?model, weight to 1.
+// Without ?endpoints the pool is the single ?endpoint (or DEFAULT_BASE).
+const HEALTH_ALPHA = 0.2;          // EWMA smoothing for latency / error / 429 rates
+const DEFAULT_LATENCY_MS = 800;    // assumed latency when no endpoint has samples yet
+
+// `prefix` selects a lane's own knobs (e.g. 'critic_' → ?critic_endpoints / ?critic_endpoint);
+// a lane without its own endpoints reuses the default pool, with ?<prefix>model forced if set.
+function parseUpstreams(prefix = '') {
+  const own = !!prefix && !!(getParam(`${prefix}endpoints`) || getParam(`${prefix}endpoint`));
+  const src = own ? prefix : '';
+  const forcedModel = prefix && !own ? getParam(`${prefix}model`) : null;
+  const defaultModel = (prefix && getParam(`${prefix}model`)) || resolveModel();
+  const list = getParam(`${src}endpoints`);
+  const entries = list
+    ? list.split(',').map(x => x.trim()).filter(Boolean)
+    : [getParam(`${src}endpoint`) || (own ? '' : DEFAULT_BASE)].filter(Boolean);
+  return entries.map((entry, i) => {
+    let rest = entry, weight = 1, model = defaultModel;
+    const w = rest.match(/\*(\d+(?:\.\d+)?)$/);
+    if (w) { weight = Math.max(0.01, Number(w[1])); rest = rest.slice(0, w.index); }
+    const at = rest.lastIndexOf('@');
+    if (at > rest.indexOf('://') + 3) { model = rest.slice(at + 1) || model; rest = rest.slice(0, at); }
+    if (forcedModel) model = forcedModel;
+    return {
+      id: i, url: chatUrl(rest), model, weight,
+      outstanding: 0, ewma_ms: null, err_rate: 0, rate_429: 0,
+      ok: 0, errors: 0, r429: 0, cool_until: 0,
+      circuit: 'closed', window: [], open_until: 0, open_ms: BREAKER_OPEN_MS, probing: false,
+    };
+  }).filter(u => u.url);
+}
+// --- Circuit breaker (per upstream) ---
+// closed: traffic flows; outcomes go into a rolling window (last BREAKER_WINDOW calls within
+//   BREAKER_WINDOW_MS). Trips to open once ≥ BREAKER_MIN_CALLS and the error+429 share ≥ threshold.
+// open: no traffic until open_until. half-open: a single probe; success closes, failure re-opens
+//   with the open period doubled (capped at BREAKER_OPEN_MAX_MS).
+const BREAKER_ON = (getParam('breaker') || 'on').toLowerCase() !== 'off';
+const BREAKER_THRESHOLD = Math.min(1, Math.max(0.05, Number(getParam('breaker_threshold') || 0.5)));
+const BREAKER_OPEN_MS = Math.max(1000, Number(getParam('breaker_open_ms') || 30000));
+const BREAKER_OPEN_MAX_MS = 5 * 60 * 1000;
+const BREAKER_WINDOW = 20;
+const BREAKER_WINDOW_MS = 60000;
+const BREAKER_MIN_CALLS = 5;
+
+function circuitAvailable(u, now = nowMs()) {
+  if (!BREAKER_ON || u.circuit === 'closed') return true;
+  if (u.circuit === 'open') {
+    if (now < u.open_until) return false;
+    u.circuit = 'half_open';
+    u.probing = false;
+  }
+  return !u.probing;
+}
+function tripCircuit(u, now) {
+  u.circuit = 'open';
+  u.open_until = now + u.open_ms;
+  u.probing = false;
+  try { console.warn(`[llmClient] circuit OPEN for ${u.url} (${Math.round(u.open_ms / 1000)}s)`); } catch {}
+}
+function noteCircuit(u, outcome) {
+  if (!BREAKER_ON) return;
+  const now = nowMs();
+  const failed = outcome !== 'ok';
+  if (u.circuit === 'half_open') {
+    if (failed) {
+      u.open_ms = Math.min(BREAKER_OPEN_MAX_MS, u.open_ms * 2);
+      tripCircuit(u, now);
+    } else {
+      u.circuit = 'closed';
+      u.open_ms = BREAKER_OPEN_MS;
+      u.window = [];
+      u.probing = false;
+    }
+    return;
+  }
+  if (u.circuit !== 'closed') return;
+  u.window.push({ at: now, failed });
+  while (u.window.length > BREAKER_WINDOW || (u.window.length && now - u.window[0].at > BREAKER_WINDOW_MS)) u.window.shift();
+  const fails = u.window.filter(x => x.failed).length;
+  if (u.window.length >= BREAKER_MIN_CALLS && fails / u.window.length >= BREAKER_THRESHOLD) tripCircuit(u, now);
+}
+// ms until some upstream in the pool accepts traffic again (0 = one is available now)
+function circuitRetryIn(pool) {
+  const now = nowMs();
+  if (pool.some(u => circuitAvailable(u, now))) return 0;
+  return Math.max(0, Math.round(Math.min(...pool.map(u => u.circuit === 'open' ? u.open_until - now : 1000))));
+}
+function circuitError(retryIn) {
+  const e = new Error(`Circuit open — LLM endpoint unavailable, retry in ~${Math.ceil(retryIn / 1000)}s`);
+  e.name = 'CircuitOpenError';
+  e.retry_in_ms = retryIn;
+  return e;
+}
+function circuitResult(retryIn, t0) {
+  return { ok: false, circuit_open: true, retry_in_ms: retryIn, latency_ms: Math.round(nowMs() - t0), error: circuitError(retryIn).message };
+}
+
+// --- Lanes: an upstream pool + limiter per traffic class ---
+// 'default' carries generation. 'critic' (guardrail's short temperature-0 calls) gets its own lane
+// — and its own budget — as soon as any ?critic_* knob is set: critic_endpoint(s), critic_model,
+// critic_min_interval_ms, critic_burst, critic_tpm, critic_concurrency; unset knobs inherit the
+// default lane's values. Without them critic calls share the default lane: one key, one limiter,
+// so the configured budget is never exceeded and generation keeps all of it when the critic is idle.
+const LANE_KNOBS = ['endpoint', 'endpoints', 'model', 'min_interval_ms', 'burst', 'tpm', 'concurrency'];
+
+function makeLane(name, prefix = '') {
+  const knob = (k) => (prefix && getParam(prefix + k)) || getParam(k);
+  return {
+    name,
+    upstreams: parseUpstreams(prefix),
+    limiter: makeLimiter({
+      minIntervalMs: Number(knob('min_interval_ms') || 900), // tune if needed
+      burst: Math.max(1, Number(knob('burst') || 2)),
+      tpm: Math.max(0, Number(knob('tpm') || 0)),
+      concurrency: Math.max(1, Number(knob('concurrency') || 2)),
+    }),
+  };
+}
+const _lanes = { default: makeLane('default') };
+if (LANE_KNOBS.some(k => getParam(`critic_${k}`))) _lanes.critic = makeLane('critic', 'critic_');
+function laneFor(name) { return _lanes[name] || _lanes.default; }
+
+// Stable identity of a lane's pool, used in cache/coalescing keys so routing doesn't split them
+function routeKey(lane) {
+  return lane.upstreams.map(u => `${u.url}@${u.model}`).join(',');
+}
+
+// Lowest expected cost wins: latency × (1 + in-flight), inflated by recent errors, ÷ weight.
+// Cooling (recently 429'd) endpoints are only used when every endpoint is cooling.
+// Endpoints without samples are rated like the fastest known one, so each gets tried.
+// Open circuits are skipped; returns null when no upstream can take the request.
+function pickUpstream(pool, avoid) {
+  const now = nowMs();
+  const known = pool.filter(u => u.ewma_ms != null).map(u => u.ewma_ms);
+  const optimistic = known.length ? Math.min(...known) : DEFAULT_LATENCY_MS;
+  const open = pool.filter(u => circuitAvailable(u, now));
+  let best = null, bestCost = Infinity;
+  for (const u of open) {
+    if (u === avoid && open.length > 1) continue;
+    const lat = u.ewma_ms ?? optimistic;
+    const cost = (u.cool_until > now ? 1e9 + u.cool_until - now : 0)
+      + lat * (1 + u.outstanding) * (1 + 4 * u.err_rate) / u.weight
+      * (0.9 + 0.2 * Math.random()); // break ties so equal endpoints share load
+    if (cost < bestCost) { best = u; bestCost = cost; }
+  }
+  return best;
+}
+function hasHealthyAlternative(pool, u) {
+  const now = nowMs();
+  return pool.some(o => o !== u && o.cool_until <= now && circuitAvailable(o, now));
+}
+function noteUpstream(u, outcome, ms) {
+  const a = HEALTH_ALPHA;
+  if (outcome === 'ok') {
+    u.ok++;
+    u.ewma_ms = u.ewma_ms == null ? ms : u.ewma_ms + a * (ms - u.ewma_ms);
+  }
+  if (outcome === 'error') u.errors++;
+  if (outcome === '429') u.r429++;
+  u.err_rate += a * ((outcome === 'error' ? 1 : 0) - u.err_rate);
+  u.rate_429 += a * ((outcome === '429' ? 1 : 0) - u.rate_429);
+  noteCircuit(u, outcome);
 }
 
-// --- One retry on 429 with Retry-After support ---
-async function postJSON(endpoint, body) {
+export function getUpstreamStats(lane = 'default') {
+  const now = nowMs();
+  return laneFor(lane).upstreams.map(u => ({
+    url: u.url, model: u.model, weight: u.weight, outstanding: u.outstanding,
+    ewma_ms: u.ewma_ms == null ? null : Math.round(u.ewma_ms),
+    err_rate: +u.err_rate.toFixed(3), rate_429: +u.rate_429.toFixed(3),
+    ok: u.ok, errors: u.errors, r429: u.r429,
+    cooling_ms: Math.max(0, Math.round(u.cool_until - now)),
+    circuit: u.circuit,
+    ...(u.circuit === 'open' ? { open_ms: Math.max(0, Math.round(u.open_until - now)) } : {}),
+  }));
+}
+
+// --- Cancellation helpers ---
+function abortError(signal) {
+  const r = signal?.reason;
+  const e = new Error(`Aborted: ${r?.message || r || 'cancelled'}`);
+  e.name = 'AbortError';
+  return e;
+}
+function abortedResult(signal, t0) {
+  return { ok: false, aborted: true, latency_ms: Math.round(nowMs() - t0), error: abortError(signal).message };
+}
+function sleep(ms, signal) {
+  return new Promise((resolve, reject) => {
+    if (signal?.aborted) return reject(abortError(signal));
+    const onAbort = () => { clearTimeout(timer); reject(abortError(signal)); };
+    const timer = setTimeout(() => { signal?.removeEventListener('abort', onAbort); resolve(); }, ms);
+    signal?.addEventListener('abort', onAbort, { once: true });
+  });
+}
+// Resolves with `promise`, or with an aborted result as soon as `signal` fires
+function raceAbort(promise, signal, t0) {
+  if (!signal) return promise;
+  if (signal.aborted) return Promise.resolve(abortedResult(signal, t0));
+  return new Promise((resolve) => {
+    const onAbort = () => resolve(abortedResult(signal, t0));
+    signal.addEventListener('abort', onAbort, { once: true });
+    promise.then(v => { signal.removeEventListener('abort', onAbort); resolve(v); });
+  });
+}
+
+// Rough prompt + completion estimate (≈4 chars/token) used to debit the TPM bucket
+function estimateTokens(messages, max_tokens) {
+  return promptTokenEstimate(messages) + Number(max_tokens || 0);
+}
+function promptTokenEstimate(messages) {
+  const chars = messages.reduce((n, m) => n + String(m.content || '').length, 0);
+  return Math.ceil(chars / 4);
+}
+
+// Give back the part of a TPM debit the call didn't actually use
+function refundTokens(lim, n) {
+  if (!lim.tok || !(n > 0)) return;
+  refill(lim.tok);
+  lim.tok.level = Math.min(lim.tok.capacity, lim.tok.level + n);
+  pump(lim);
+}
+
+function parseRetryAfter(v) {
+  if (!v) return 0;
+  const secs = Number(v);
+  if (Number.isFinite(secs)) return Math.max(0, secs * 1000);
+  const at = Date.parse(v);
+  return Number.isFinite(at) ? Math.max(0, at - Date.now()) : 0;
+}
+// Retry-After wins when present; otherwise exponential backoff with "equal jitter"
+function backoffMs(attempt, retryAfter) {
+  const ra = parseRetryAfter(retryAfter);
+  if (ra > 0) return ra + Math.random() * 250;
+  const exp = Math.min(BACKOFF_MAX_MS, BACKOFF_BASE_MS * Math.pow(2, attempt));
+  return exp / 2 + Math.random() * (exp / 2);
+}
+
+export function getLimiterStats(lane = 'default') {
+  const lim = laneFor(lane).limiter;
+  refill(lim.req);
+  if (lim.tok) refill(lim.tok);
+  return {
+    queued: lim.queue.length,
+    in_flight: lim.inFlight,
+    concurrency: lim.concurrency,
+    rpm: Number.isFinite(lim.rpm) ? Math.round(lim.rpm) : null,
+    burst: lim.burst,
+    req_tokens: Math.floor(lim.req.level),
+    tpm: lim.tpm || null,
+    tpm_tokens: lim.tok ? Math.floor(lim.tok.level) : null,
+    paused_ms: Math.max(0, Math.round(lim.pausedUntil - nowMs())),
+  };
+}
+
+// --- Response cache: in-memory LRU + IndexedDB, keyed by the request body ---
+// ?cache=off bypasses it; by default only temperature 0 requests are cached so
+// "New one" still samples fresh text. ?cache=all caches sampled requests too.
+const CACHE_MODE = (getParam('cache') || 'on').toLowerCase();   // on | off | all
+const CACHE_TTL_MS = Number(getParam('cache_ttl_ms') || 24 * 60 * 60 * 1000);
+const CACHE_MEM_MAX = 200;    // entries kept in memory
+const CACHE_IDB_MAX = 2000;   // entries kept in IndexedDB
+const CACHE_MAX_CHARS = 16000; // skip caching oversized replies
+const CACHE_DB = 'lemonade_llm_cache_v1';
+const CACHE_STORE = 'responses';
+
+const _mem = new Map(); // key -> { text, at }; Map order doubles as LRU order
+const _cacheStats = { hits: 0, misses: 0, writes: 0 };
+let _cacheDb = null;
+let _cacheWrites = 0;
+
+function cacheable(body) {
+  if (CACHE_MODE === 'off') return false;
+  if (CACHE_MODE === 'all') return true;
+  return Number(body?.temperature) === 0;
+}
+
+// 53-bit string hash (cyrb53) — plenty for a per-origin response cache
+function hashKey(str) {
+  let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+  for (let i = 0; i < str.length; i++) {
+    const ch = str.charCodeAt(i);
+    h1 = Math.imul(h1 ^ ch, 2654435761);
+    h2 = Math.imul(h2 ^ ch, 1597334677);
+  }
+  h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+  h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+  return (4294967296 * (2097151 & h2) + (h1 >>> 0)).toString(36);
+}
+function cacheKey(route, body) {
+  const { model, messages, max_tokens, temperature } = body;
+  return hashKey(JSON.stringify([route, model, messages, max_tokens, temperature]));
+}
+
+function openCacheDb() {
+  if (_cacheDb) return _cacheDb;
+  _cacheDb = new Promise((resolve) => {
+    try {
+      if (typeof indexedDB === 'undefined') return resolve(null);
+      const req = indexedDB.open(CACHE_DB, 1);
+      req.onupgradeneeded = () => {
+        const s = req.result.createObjectStore(CACHE_STORE, { keyPath: 'k' });
+        s.createIndex('at', 'at', { unique: false });
+      };
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => resolve(null);
+    } catch { resolve(null); }
+  });
+  return _cacheDb;
+}
+function idbRequest(mode, op) {
+  return openCacheDb().then(db => new Promise((resolve) => {
+    if (!db) return resolve(null);
+    try {
+      const tx = db.transaction(CACHE_STORE, mode);
+      const req = op(tx.objectStore(CACHE_STORE));
+      if (!req) { tx.oncomplete = () => resolve(null); tx.onerror = () => resolve(null); return; }
+      req.onsuccess = () => resolve(req.result ?? null);
+      req.onerror = () => resolve(null);
+    } catch { resolve(null); }
+  }));
+}
+
+function memSet(key, entry) {
+  _mem.delete(key);
+  _mem.set(key, entry);
+  while (_mem.size > CACHE_MEM_MAX) _mem.delete(_mem.keys().next().value);
+}
+
+async function cacheGet(key) {
+  const now = Date.now();
+  let entry = _mem.get(key);
+  if (!entry) {
+    const row = await idbRequest('readonly', (s) => s.get(key));
+    if (row) entry = { text: row.text, at: row.at };
+  }
+  if (!entry || now - entry.at > CACHE_TTL_MS) {
+    if (entry) { _mem.delete(key); idbRequest('readwrite', (s) => s.delete(key)); }
+    _cacheStats.misses++;
+    return null;
+  }
+  memSet(key, entry); // refresh LRU position
+  _cacheStats.hits++;
+  return entry.text;
+}
+
+function cachePut(key, text) {
+  if (!text || text.length > CACHE_MAX_CHARS) return;
+  const entry = { text, at: Date.now() };
+  memSet(key, entry);
+  _cacheStats.writes++;
+  idbRequest('readwrite', (s) => s.put({ k: key, ...entry }));
+  if (++_cacheWrites % 50 === 0) pruneCacheDb();
+}
+
+// Drop the oldest rows once the persistent store grows past CACHE_IDB_MAX
+async function pruneCacheDb() {
+  const total = await idbRequest('readonly', (s) => s.count());
+  let excess = Number(total || 0) - CACHE_IDB_MAX;
+  if (excess <= 0) return;
+  await idbRequest('readwrite', (s) => {
+    const cur = s.index('at').openCursor();
+    cur.onsuccess = () => {
+      const c = cur.result;
+      if (!c || excess-- <= 0) return;
+      c.delete();
+      c.continue();
+    };
+    return null;
+  });
+}
+
+export async function clearLlmCache() {
+  _mem.clear();
+  await idbRequest('readwrite', (s) => s.clear());
+}
+
+// --- Send through the limiter to the best upstream; retry 429/503 up to MAX_RETRIES ---
+// A 429/503/network error fails over to another healthy upstream right away; with none
+// left it backs off (429s pause every caller). Returns { res, latency_ms, release, upstream } —
+// the caller releases the slot once the body is read. `onSent(at)` fires each time a request
+// actually leaves (after the limiter), so callers can time the upstream without queue wait.
+async function postJSON(lane, body, signal, cost, onSent) {
   const t0 = nowMs();
-  const doFetch = () => fetch(endpoint, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(body),
+  const { limiter: lim, upstreams: pool } = lane;
+  let last = null;
+
+  for (let attempt = 0; ; attempt++) {
+    const release = await acquireSlot(lim, cost, signal);
+    const up = pickUpstream(pool, last);
+    if (!up) { release(); throw circuitError(circuitRetryIn(pool)); }
+    const sentAt = nowMs();
+    try { onSent && onSent(sentAt); } catch {}
+    up.outstanding++;
+    if (up.circuit === 'half_open') up.probing = true;
+    let done = false;
+    const finish = () => {
+      if (done) return;
+      done = true;
+      up.outstanding--;
+      if (up.circuit === 'half_open') up.probing = false; // probe cancelled before an outcome
+      release();
+    };
+
+    let res;
+    try {
+      res = await fetch(up.url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...body, model: up.model }),
+        ...(signal ? { signal } : {}),
+      });
+    } catch (e) {
+      finish();
+      if (signal?.aborted) throw e;
+      noteUpstream(up, 'error', nowMs() - sentAt);
+      if (attempt < MAX_RETRIES && hasHealthyAlternative(pool, up)) { last = up; continue; }
+      throw e;
+    }
+
+    noteUpstream(up, res.status === 429 ? '429' : res.status >= 500 ? 'error' : 'ok', nowMs() - sentAt);
+    const retryable = res.status === 429 || res.status === 503;
+    if (!retryable || attempt >= MAX_RETRIES) {
+      return { res, latency_ms: Math.round(nowMs() - t0), release: finish, upstream: up };
+    }
+
+    const wait = backoffMs(attempt, res.headers.get('retry-after'));
+    if (res.status === 429) up.cool_until = Math.max(up.cool_until, nowMs() + wait);
+    try { res.body?.cancel?.(); } catch {}
+    finish();
+    last = up;
+    if (hasHealthyAlternative(pool, up)) continue;
+    const retryIn = circuitRetryIn(pool);
+    if (retryIn > 0) throw circuitError(retryIn); // just tripped: fail fast instead of backing off
+    if (res.status === 429) lim.pausedUntil = Math.max(lim.pausedUntil, nowMs() + wait);
+    await sleep(wait, signal);
+  }
+}
+
+// --- Single-flight: identical in-flight requests share one fetch promise ---
+// Deterministic (temperature 0) requests always coalesce. Sampled ones only with
+// ?coalesce=all or { coalesce: true }, since callers may want distinct samples.
+// Joiners get the leader's final result (no onToken replay); ?coalesce=off disables.
+const COALESCE_MODE = (getParam('coalesce') || 'on').toLowerCase(); // on | off | all
+const _inflight = new Map(); // hash(route + body) -> Promise<result>
+const _flightStats = { leaders: 0, joined: 0 };
+
+function coalescible(body, optIn) {
+  if (COALESCE_MODE === 'off' || optIn === false) return false;
+  if (COALESCE_MODE === 'all' || optIn === true) return true;
+  return Number(body?.temperature) === 0;
+}
+
+// --- Hedged requests: duplicate the slow tail, keep whichever answers first ---
+// Threshold = p90 of recent latencies for the request's max_tokens class (needs HEDGE_MIN_SAMPLES);
+// ?hedge_after_ms sets a fixed threshold until then. ?hedge_budget caps hedges as a share of requests.
+// Latencies and the threshold timer are measured from when the request is sent, not from when it
+// joined the limiter queue, and nothing is hedged while the lane's limiter has callers waiting.
+const HEDGE_ON = ['1', 'on', 'true'].includes(String(getParam('hedge') || '').toLowerCase());
+const HEDGE_BUDGET = Math.min(1, Math.max(0, Number(getParam('hedge_budget') ?? 0.1)));
+const HEDGE_AFTER_MS = Math.max(0, Number(getParam('hedge_after_ms') || 0));
+const HEDGE_QUANTILE = 0.9;
+const HEDGE_MIN_SAMPLES = 10;
+const HEDGE_WINDOW = 100;    // latency samples kept per class
+const _latency = new Map();  // class -> recent latencies (ms), oldest first
+const _hedgeStats = { requests: 0, hedged: 0, hedge_wins: 0 };
+
+function latencyClass(max_tokens) {
+  const n = Number(max_tokens) || 0;
+  return n <= 128 ? 'short' : n <= 512 ? 'medium' : 'long';
+}
+function recordLatency(cls, ms) {
+  const list = _latency.get(cls) || [];
+  list.push(ms);
+  if (list.length > HEDGE_WINDOW) list.shift();
+  _latency.set(cls, list);
+}
+function hedgeThreshold(cls) {
+  const list = _latency.get(cls) || [];
+  if (list.length < HEDGE_MIN_SAMPLES) return HEDGE_AFTER_MS || null;
+  const sorted = [...list].sort((a, b) => a - b);
+  return sorted[Math.min(sorted.length - 1, Math.floor(HEDGE_QUANTILE * sorted.length))];
+}
+function hedgeAllowed() {
+  return _hedgeStats.hedged + 1 <= HEDGE_BUDGET * _hedgeStats.requests;
+}
+
+// Runs `attempt(signal, onSent)` once, plus one duplicate if it is still pending `threshold` ms after
+// it was sent. Each attempt gets its own controller (chained to the caller's signal) so the loser
+// can be cancelled.
+async function hedged(cls, lim, signal, attempt) {
+  _hedgeStats.requests++;
+  const t0 = nowMs();
+  const threshold = hedgeThreshold(cls);
+  const sentAt = [null, null]; // per attempt: last time it left the limiter
+  const link = () => {
+    const c = new AbortController();
+    const fwd = () => c.abort(signal.reason);
+    if (signal) signal.addEventListener('abort', fwd, { once: true });
+    return { c, unlink: () => signal?.removeEventListener('abort', fwd) };
+  };
+
+  const primary = link();
+  let hedge = null;
+
+  const result = await new Promise((resolve) => {
+    let pending = 1, firstFail = null, timer = null, armed = false;
+    const settle = (i) => (out) => {
+      pending--;
+      if (out.ok) { clearTimeout(timer); return resolve({ out, i }); }
+      if (i === 0 || !firstFail) firstFail = { out, i };
+      // a fast failure isn't a slow request: don't hedge it, let the caller see the error
+      if (pending === 0) { clearTimeout(timer); resolve(firstFail); }
+    };
+    const fire = () => {
+      timer = null;
+      // a saturated limiter is local backpressure, not a slow upstream: a duplicate would only queue
+      if (pending === 0 || signal?.aborted || lim.queue.length > 0 || !hedgeAllowed()) return;
+      _hedgeStats.hedged++;
+      hedge = link();
+      pending++;
+      attempt(hedge.c.signal, (at) => { sentAt[1] = at; }).finally(hedge.unlink).then(settle(1));
+    };
+    const onPrimarySent = (at) => {
+      sentAt[0] = at;
+      if (armed || threshold == null) return;
+      armed = true;
+      timer = setTimeout(fire, threshold);
+    };
+    attempt(primary.c.signal, onPrimarySent).finally(primary.unlink).then(settle(0));
   });
 
-  let res = await doFetch();
-  if (res.status === 429) {
-    // honor Retry-After if present, else back off 2s
-    const ra = Number(res.headers.get('retry-after') || 0);
-    const backoff = isFinite(ra) && ra > 0 ? ra * 1000 : 2000;
-    await new Promise(r => setTimeout(r, backoff));
-    res = await doFetch();
+  // cancel whichever attempt is still running
+  if (result.i === 0) { try { hedge?.c.abort(new Error('hedge lost')); } catch {} }
+  else { try { primary.c.abort(new Error('hedge lost')); } catch {} }
+
+  const out = result.out;
+  const sent = sentAt[result.i];
+  if (out.ok && sent != null) recordLatency(cls, Math.round(nowMs() - sent));
+  if (!hedge) return out;
+  if (result.i === 1) _hedgeStats.hedge_wins++;
+  return { ...out, latency_ms: Math.round(nowMs() - t0), hedged: true }; // caller-observed latency, not the winner's own
+}
+
+// --- Usage accounting: provider `usage` block when present, else a chars/4 estimate ---
+const ZERO_USAGE = Object.freeze({ prompt_tokens: 0, completion_tokens: 0, total_tokens: 0 });
+
+function usageOf(raw, messages, text) {
+  const u = raw?.usage || raw?.x_groq?.usage;
+  const p = Number(u?.prompt_tokens), c = Number(u?.completion_tokens);
+  if (Number.isFinite(p) && Number.isFinite(c)) {
+    const t = Number(u.total_tokens);
+    return { prompt_tokens: p, completion_tokens: c, total_tokens: Number.isFinite(t) ? t : p + c };
   }
-  const latency_ms = Math.round(nowMs() - t0);
-  return { res, latency_ms };
+  const pe = promptTokenEstimate(messages);
+  const ce = Math.ceil(String(text || '').length / 4);
+  return { prompt_tokens: pe, completion_tokens: ce, total_tokens: pe + ce, estimated: true };
 }
 
-// Public API
-export async function generateText({ system, user, max_tokens = 512, temperature = 0.3 }) {
-  const endpoint = resolveEndpoint();
-  const model = resolveModel();
+// --- SSE streaming: read `data:` chunks, surface deltas, stop early on demand ---
+const STREAM_DEFAULT = getParam('stream') === '1';
 
-  if (!endpoint) return { ok: false, error: 'No endpoint configured (?endpoint=...)' };
+function isEventStream(res) {
+  const ct = String(res?.headers?.get?.('content-type') || '');
+  return /text\/event-stream/i.test(ct) && !!res.body?.getReader;
+}
+
+async function readEventStream(res, { onToken, stopWhen, t0 }) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = '', text = '', ttft_ms = null, stopped = false, usage = null;
+
+  read: while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buf.indexOf('\n')) >= 0) {
+      const line = buf.slice(0, nl).trim();
+      buf = buf.slice(nl + 1);
+      if (!line.startsWith('data:')) continue;
+      const data = line.slice(5).trim();
+      if (data === '[DONE]') break read;
+      let delta = '';
+      try {
+        const j = JSON.parse(data);
+        if (j?.usage || j?.x_groq?.usage) usage = j; // usage arrives on the last chunk(s)
+        const c = j?.choices?.[0];
+        delta = c?.delta?.content ?? c?.text ?? '';
+      } catch { continue; }
+      if (!delta) continue;
+      if (ttft_ms == null) ttft_ms = Math.round(nowMs() - t0);
+      text += delta;
+      try { onToken && onToken(delta, text); } catch {}
+      if (stopWhen && stopWhen(text)) { stopped = true; break read; }
+    }
+  }
+  if (stopped) { try { await reader.cancel(); } catch {} }
+  return { text, ttft_ms, stopped, usage };
+}
+
+// Public API
+// `lane`: 'default' (generation) or 'critic' — see Lanes above.
+export async function generateText({ system, user, max_tokens = 512, temperature = 0.3, stream, onToken, stopWhen, coalesce, signal, lane: laneName }) {
+  const lane = laneFor(laneName);
+  const pool = lane.upstreams;
+  if (!pool.length) return { ok: false, error: 'No endpoint configured (?endpoint=...)' };
+  const route = routeKey(lane);
+  const model = pool[0].model;
   if (!model) return { ok: false, error: 'No model configured (?model=...)' };
 
-  // Helpful one-time console line
+  // Helpful one-time console line (per lane)
   try {
-    if (!window.__LLM_LOGGED__) {
-      console.log(`[llmClient] endpoint=${endpoint} model=${model} min_interval=${MIN_INTERVAL_MS}ms`);
-      window.__LLM_LOGGED__ = true;
+    globalThis.__LLM_LOGGED__ = globalThis.__LLM_LOGGED__ || {};
+    if (!globalThis.__LLM_LOGGED__[lane.name]) {
+      const lim = lane.limiter;
+      const where = pool.length > 1 ? `endpoints=${pool.length}` : `endpoint=${pool[0].url}`;
+      const tag = lane.name === 'default' ? '' : ` [${lane.name}]`;
+      console.log(`[llmClient]${tag} ${where} model=${model} rpm=${Number.isFinite(lim.rpm) ? Math.round(lim.rpm) : '∞'} burst=${lim.burst} tpm=${lim.tpm || '∞'} concurrency=${lim.concurrency}`);
+      globalThis.__LLM_LOGGED__[lane.name] = true;
     }
   } catch {}
 
@@ -84,20 +764,77 @@ export async function generateText({ system, user, max_tokens = 512, temperature
     ...(system ? [{ role: 'system', content: String(system) }] : []),
     { role: 'user', content: String(user || '') },
   ];
-  const body = { model, messages, max_tokens, temperature, stream: false };
+  const streaming = stream ?? STREAM_DEFAULT;
+  const body = { model, messages, max_tokens, temperature, stream: !!streaming };
 
-  // throttle between calls
-  await throttle();
+  // cache lookup (before the limiter — hits cost no request slot)
+  const t0 = nowMs();
+  if (signal?.aborted) return abortedResult(signal, t0);
+  const key = cacheable(body) ? cacheKey(route, body) : null;
+  if (key) {
+    const hit = await cacheGet(key);
+    if (hit) return { ok: true, text: hit, latency_ms: Math.round(nowMs() - t0), usage: { ...ZERO_USAGE }, cached: true };
+  }
+
+  // every circuit open: fail fast without queueing for a limiter slot
+  const retryIn = circuitRetryIn(pool);
+  if (retryIn > 0) return circuitResult(retryIn, t0);
+
+  // streamed replies aren't hedged: two token streams can't share one onToken callback
+  const send = HEDGE_ON && !streaming
+    ? () => hedged(`${lane.name}:${latencyClass(max_tokens)}`, lane.limiter, signal, (sig, onSent) =>
+        sendAndRead(lane, body, messages, { key, t0, streaming, onToken, stopWhen, signal: sig, onSent }))
+    : () => sendAndRead(lane, body, messages, { key, t0, streaming, onToken, stopWhen, signal });
+  const flightKey = coalescible(body, coalesce) ? hashKey(JSON.stringify([route, body])) : null;
+  if (!flightKey) return send();
 
-  let res, latency_ms;
+  const pending = _inflight.get(flightKey);
+  if (pending) {
+    _flightStats.joined++;
+    const shared = await raceAbort(pending, signal, t0);
+    if (shared.aborted && signal?.aborted) return shared;
+    if (shared.aborted) return send(); // the leader was cancelled, not us
+    return { ...shared, usage: { ...ZERO_USAGE }, coalesced: true };
+  }
+  const flight = send().finally(() => _inflight.delete(flightKey));
+  _inflight.set(flightKey, flight);
+  _flightStats.leaders++;
+  return flight;
+}
+
+async function sendAndRead(lane, body, messages, { key, t0, streaming, onToken, stopWhen, signal, onSent }) {
+  let res, latency_ms, release;
+  // Per-request controller: aborted by the caller's signal, or by us after an early stream stop
+  const controller = (streaming || signal) && typeof AbortController !== 'undefined' ? new AbortController() : null;
+  const forward = () => { try { controller.abort(signal.reason); } catch {} };
+  if (signal && controller) signal.addEventListener('abort', forward, { once: true });
+  const debit = estimateTokens(messages, body.max_tokens);
   try {
-    const out = await postJSON(endpoint, body);
-    res = out.res;
-    latency_ms = out.latency_ms;
-  } catch (e) {
-    return { ok: false, error: `Network error: ${e?.message || e}` };
+    try {
+      const out = await postJSON(lane, body, controller?.signal, debit, onSent);
+      res = out.res;
+      latency_ms = out.latency_ms;
+      release = out.release;
+    } catch (e) {
+      if (signal?.aborted) return abortedResult(signal, t0);
+      if (e?.name === 'CircuitOpenError') return circuitResult(e.retry_in_ms, t0);
+      return { ok: false, error: `Network error: ${e?.message || e}` };
+    }
+
+    try {
+      const out = await readReply(res, { key, t0, latency_ms, streaming, controller, onToken, stopWhen, messages });
+      if (!out.ok && signal?.aborted) return abortedResult(signal, t0);
+      if (out.usage && !out.usage.estimated) refundTokens(lane.limiter, debit - out.usage.total_tokens);
+      return out;
+    } finally {
+      release();
+    }
+  } finally {
+    signal?.removeEventListener('abort', forward);
   }
+}
 
+async function readReply(res, { key, t0, latency_ms, streaming, controller, onToken, stopWhen, messages }) {
   if (!res.ok) {
     let details = '';
     try { details = await res.text(); } catch {}
@@ -105,6 +842,24 @@ export async function generateText({ system, user, max_tokens = 512, temperature
     return { ok: false, latency_ms, error: `HTTP ${res.status} ${res.statusText}${brief ? ` — ${brief}` : ''}` };
   }
 
+  // Streamed reply (servers that ignore stream:true fall through to plain JSON)
+  if (streaming && isEventStream(res)) {
+    let out;
+    try {
+      out = await readEventStream(res, { onToken, stopWhen, t0 });
+    } catch (e) {
+      return { ok: false, latency_ms, error: `Stream error: ${e?.message || e}` };
+    } finally {
+      try { controller?.abort(); } catch {}
+    }
+    const text = out.text.trim();
+    latency_ms = Math.round(nowMs() - t0);
+    if (!text) return { ok: false, latency_ms, error: 'Empty response from model' };
+    if (key && !out.stopped) cachePut(key, text);
+    const usage = usageOf(out.usage, messages, text);
+    return { ok: true, text, latency_ms, usage, ttft_ms: out.ttft_ms, stopped_early: out.stopped };
+  }
+
   let json;
   try { json = await res.json(); } catch (e) {
     return { ok: false, latency_ms, error: `Bad JSON from model: ${e?.message || e}` };
@@ -112,9 +867,32 @@ export async function generateText({ system, user, max_tokens = 512, temperature
 
   const text = extractText(json).trim();
   if (!text) return { ok: false, latency_ms, error: 'Empty response from model' };
-  return { ok: true, text, latency_ms };
+  if (key) cachePut(key, text);
+  return { ok: true, text, latency_ms, usage: usageOf(json, messages, text) };
+}
+
+function laneConfig(name) {
+  const lane = laneFor(name);
+  return {
+    endpoint: lane.upstreams[0]?.url || '',
+    model: lane.upstreams[0]?.model || resolveModel(),
+    upstreams: getUpstreamStats(name),
+    min_interval_ms: lane.limiter.minIntervalMs,
+    limiter: getLimiterStats(name),
+  };
 }
 
 export function getLlmConfig() {
-  return { endpoint: resolveEndpoint(), model: resolveModel(), min_interval_ms: MIN_INTERVAL_MS };
+  return {
+    ...laneConfig('default'),
+    // critic lane only when configured separately (?critic_*); otherwise it is the default lane
+    critic: _lanes.critic ? laneConfig('critic') : null,
+    stream: STREAM_DEFAULT,
+    coalesce: { mode: COALESCE_MODE, in_flight: _inflight.size, ..._flightStats },
+    hedge: {
+      on: HEDGE_ON, budget: HEDGE_BUDGET, ..._hedgeStats,
+      thresholds: Object.fromEntries([..._latency.keys()].map(k => [k, hedgeThreshold(k)])),
+    },
+    cache: { mode: CACHE_MODE, ttl_ms: CACHE_TTL_MS, size: _mem.size, ..._cacheStats },
+  };
 }
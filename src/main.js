@@ -1,12 +1,21 @@
 // src/main.js — streams logs, wires UI, saves run + feedback, updates KPI drawer
 
 import * as ui from "./ui.js";
-import { runPipeline } from "./orchestrator.js";
-import { saveRun, saveFeedback, exportCSV } from "./feedbackDb.js";
-import { refreshKpiPanel } from "./kpis.js";
+import { runPipeline } from "./pipelineClient.js"; // worker-backed; same API as orchestrator.runPipeline
 
 let currentRunId = null; // link feedback to the latest run
 
+// KPI drawer + IndexedDB (kpis.js, feedbackDb.js) stay off the startup path: loaded on first use —
+// drawer opened, run saved or feedback given. (build_bundle.py keeps them as a separate chunk.)
+let _kpiMods = null;
+const kpiModules = () => (_kpiMods ||= Promise.all([import('./kpis.js'), import('./feedbackDb.js')])
+  .then(([kpis, db]) => ({ kpis, db })));
+const saveRun = async (event) => (await kpiModules()).db.saveRun(event);
+const saveFeedback = async (feedback) => (await kpiModules()).db.saveFeedback(feedback);
+const refreshKpiPanel = async () => (await kpiModules()).kpis.refreshKpiPanel();
+// thumbs FAB + textarea auto-size live in kpis.js too; set up once a result is on screen
+const prepareResultArea = () => kpiModules().then(({ kpis }) => kpis.prepareResultArea()).catch(() => {});
+
 function labelFor(type){
   if (type === 'microcopy') return 'Microcopy';
   if (type === 'press_release') return 'PR / External';
@@ -50,23 +59,30 @@ function setVerdictUI(scoring){
 async function doGenerate(){
   // clear + show log
   const logCardEl = document.getElementById('log-card');
-  const logPanel = document.getElementById('log-panel');
-  logPanel.innerHTML = '';
+  ui.clearLog();
   logCardEl.classList.remove('hide');
 
   const type = ui.currentType();
   const params = ui.getParams();
 
+  const resultsCardEl = document.getElementById('result-card');
+  const resultTextEl = document.getElementById('result-text');
+
   const report = await runPipeline({
     type,
     params,
-    onLog: (line) => ui.log(line) // stream logs live
+    onLog: (line) => ui.log(line), // stream logs live
+    onToken: (text) => {           // streamed draft preview (?stream=1)
+      const first = resultsCardEl.classList.contains('hide');
+      resultsCardEl.classList.remove('hide');
+      resultTextEl.value = text;
+      if (first) prepareResultArea();
+    }
   });
 
   // Show results
-  const resultsCardEl = document.getElementById('result-card');
-  const resultTextEl = document.getElementById('result-text');
   resultsCardEl.classList.remove('hide');
+  prepareResultArea();
 
   if (report.ok) {
     resultTextEl.value = report.result || '';
@@ -81,6 +97,8 @@ async function doGenerate(){
       trs_initial: report.attempts?.[0]?.trs ?? null,
       trs_retry: report.attempts?.[1]?.trs ?? null,
       duration_ms: report.duration_ms ?? null,
+      llm_calls: report.usage?.calls ?? null,
+      tokens_total: report.usage?.total_tokens ?? null,
       createdAt: new Date().toISOString()
     };
     currentRunId = await saveRun(event);
@@ -138,8 +156,7 @@ function init() {
   document.getElementById('result-card')?.classList.add('hide');
 
   wireValidation();
-  setupKpiDrawer();
-  refreshKpiPanel(); // pre-fill if any data exists
+  setupKpiDrawer(); // fills the panel (and loads kpis.js) when first opened
 
   // type picker
   const picker = document.getElementById('type-picker');
@@ -159,7 +176,7 @@ function init() {
 
     document.getElementById('result-card')?.classList.add('hide');
     document.getElementById('log-card')?.classList.add('hide');
-    document.getElementById('log-panel').innerHTML = '';
+    ui.clearLog();
   });
 
   // Generate
@@ -189,10 +206,24 @@ function init() {
     }
     await doGenerate();
   });
+}
 
-  // KPI exports
-  document.getElementById('export-events')?.addEventListener('click', () => exportCSV('events'));
-  document.getElementById('export-feedback')?.addEventListener('click', () => exportCSV('feedback'));
+// Offline shell + corpus cache (sw.js). Registered after load so it doesn't compete with startup;
+// ?sw=0 unregisters it (useful while editing files, as the shell is served stale-while-revalidate).
+function registerServiceWorker() {
+  if (!('serviceWorker' in navigator)) return;
+  let off = false;
+  try { off = new URLSearchParams(location.search).get('sw') === '0'; } catch {}
+  if (off) {
+    navigator.serviceWorker.getRegistrations()
+      .then(regs => regs.forEach(r => r.unregister()))
+      .catch(() => {});
+    return;
+  }
+  navigator.serviceWorker.register('./sw.js').catch((e) => {
+    console.warn('[sw] registration failed:', e?.message || e); // e.g. file:// or an insecure origin
+  });
 }
 
 document.addEventListener('DOMContentLoaded', init);
+window.addEventListener('load', registerServiceWorker);
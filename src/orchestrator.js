@@ -1,85 +1,69 @@
 // src/orchestrator.js
 // LLM-first pipeline with streaming logs: policy → normalize(params) → validate → corpus(+lexicon) → generate
 // → log RAW + SHAPED → TRS → iterative revise (until PASS/BORDERLINE or cap)
-// Dev feature: visible "Verbose prompts" toggle + ?verbose=1 support
+// Dev feature: ?verbose=1 (or the "Verbose prompts" toggle in ui.js) logs full prompts
 
 import { getPolicy, validateRequired, getTraits, getIntentLexicon } from './policy.js';
-import { compactTraits, labelFor, enforceOutputShape } from './util.js';
+import { compactTraits, labelFor, enforceOutputShape, earlyStopFor } from './util.js';
 import { genTemplate_generate, genTemplate_revise } from './prompts.js';
 import { generateText } from './llmClient.js';
 import { loadCorpusWithLexicon, pickRefs } from './corpus.js';
-import { score as scoreTRS } from './guardrail.js';
+import { score as scoreTRS, scoreMany } from './guardrail.js';
 
 const MAX_TRIES = 6;
-const MAX_DURATION_MS = 5000; // 5 second timeout
+const MAX_DURATION_MS = 5000; // 5 second deadline per run (?max_duration_ms overrides)
+const MAX_CANDIDATES = 4;       // cap for ?candidates=N on the initial attempt
 
-// --- Dev verbose toggle ---
+// --- Dev verbose flag (?verbose=1, or the toggle ui.js adds above the log panel) ---
 function isVerbose() {
   try {
     if (typeof window !== 'undefined' && window.__DEV_VERBOSE === true) return true;
-    const usp = new URLSearchParams(window.location.search);
+    const usp = new URLSearchParams(location.search);
     return usp.has('verbose') && usp.get('verbose') !== '0';
   } catch { return false; }
 }
-function setVerbose(v) {
+
+// --- Initial fan-out: ?candidates=N generates N first drafts and keeps the best ---
+function candidateCount() {
   try {
-    window.__DEV_VERBOSE = !!v;
-    const usp = new URLSearchParams(window.location.search);
-    if (v) usp.set('verbose', '1'); else usp.delete('verbose');
-    const url = `${location.pathname}?${usp.toString()}${location.hash || ''}`.replace(/\?$/, '');
-    history.replaceState(null, '', url);
-    const panel = document.getElementById('log-panel');
-    if (panel) {
-      const line = document.createElement('div');
-      line.textContent = `[dev] Verbose prompts: ${v ? 'ON' : 'OFF'}`;
-      panel.appendChild(line);
-      panel.scrollTop = panel.scrollHeight;
-    }
-  } catch {}
+    const usp = new URLSearchParams(globalThis.location.search); // page or pipeline worker
+    const n = Math.floor(Number(usp.get('candidates') || 1));
+    return Number.isFinite(n) ? Math.max(1, Math.min(MAX_CANDIDATES, n)) : 1;
+  } catch { return 1; }
 }
-function injectVerboseToggleOnce() {
-  if (typeof window === 'undefined') return;
-  if (window.__VERBOSE_CTRL_INIT__) return;
-  window.__VERBOSE_CTRL_INIT__ = true;
-
-  document.addEventListener('DOMContentLoaded', () => {
-    const logPanel = document.getElementById('log-panel');
-    if (!logPanel) return;
-
-    const bar = document.createElement('div');
-    bar.id = 'log-dev-controls';
-    bar.style.display = 'flex';
-    bar.style.alignItems = 'center';
-    bar.style.gap = '12px';
-    bar.style.margin = '8px 0';
-
-    const label = document.createElement('label');
-    label.style.display = 'inline-flex';
-    label.style.alignItems = 'center';
-    label.style.gap = '6px';
-    label.style.cursor = 'pointer';
-
-    const cb = document.createElement('input');
-    cb.type = 'checkbox';
-    cb.id = 'toggle-verbose-prompts';
-    cb.checked = isVerbose();
-    cb.addEventListener('change', () => setVerbose(cb.checked));
-
-    const span = document.createElement('span');
-    span.textContent = 'Verbose prompts';
-    span.title = 'Show full SYSTEM + USER prompts in the log. Toggle off to show short snippets.';
-
-    label.appendChild(cb);
-    label.appendChild(span);
-    bar.appendChild(label);
-
-    const parent = logPanel.parentElement || logPanel;
-    parent.insertBefore(bar, logPanel);
-
-    setVerbose(cb.checked);
-  });
+
+// --- Per-run deadline: one AbortSignal threaded through the critic and revision calls ---
+function maxDurationMs() {
+  try {
+    const usp = new URLSearchParams(globalThis.location.search);
+    const n = Number(usp.get('max_duration_ms'));
+    return Number.isFinite(n) && n > 0 ? n : MAX_DURATION_MS;
+  } catch { return MAX_DURATION_MS; }
+}
+// Aborts after `ms`, or as soon as the caller's own `parent` signal aborts
+function makeDeadline(ms, parent) {
+  const ctrl = new AbortController();
+  const expire = (reason) => { if (!ctrl.signal.aborted) ctrl.abort(reason); };
+  const timer = setTimeout(() => expire(new Error(`deadline exceeded (${ms}ms)`)), ms);
+  const onParent = () => expire(parent.reason ?? new Error('cancelled'));
+  if (parent?.aborted) onParent();
+  else parent?.addEventListener('abort', onParent, { once: true });
+  return {
+    ms,
+    signal: ctrl.signal,
+    get expired() { return ctrl.signal.aborted; },
+    clear() { clearTimeout(timer); parent?.removeEventListener('abort', onParent); }
+  };
+}
+
+// One candidate → regular score(); several pending → one batched critic call.
+async function scoreCandidates(texts, ctx) {
+  if (texts.length === 1) return [await scoreTRS({ ...ctx, text: texts[0] })];
+  return scoreMany({ ...ctx, texts });
 }
-injectVerboseToggleOnce();
+
+const budgetLine = (tag, tpl) =>
+  `📏 Prompt ${tag} ≈${tpl.tokens} tokens (budget ${tpl.budget}${tpl.compaction ? `, compaction level ${tpl.compaction}` : ''}).`;
 
 const snip = (t, n = 140) => {
   const s = String(t || '').replace(/\s+/g, ' ').trim();
@@ -97,6 +81,8 @@ function scoringLine(tag, s) {
 function makeSmartFixes(type, scoring, params) {
   const fixes = [];
   const { breakdown } = scoring;
+  // batched scoring keeps matches per candidate; single score() leaves them on params
+  const semanticMatches = scoring?.semanticMatches ?? params?._semanticMatches;
   
   // Rules-based fixes (40 points max)
   if (breakdown?.rules?.score < 30) {
@@ -111,7 +97,7 @@ function makeSmartFixes(type, scoring, params) {
       }
     } else if (type === 'internal_comms') {
       // Provide specific feedback based on semantic matches
-      if (params?._semanticMatches) {
+      if (semanticMatches) {
         const missingKeywords = [];
         const semanticHints = [];
         
@@ -121,7 +107,7 @@ function makeSmartFixes(type, scoring, params) {
         const allKeywords = [...titleWords, ...updateWords];
         
         for (const keyword of allKeywords) {
-          const found = params._semanticMatches.find(m => m.keyword === keyword);
+          const found = semanticMatches.find(m => m.keyword === keyword);
           if (!found) {
             missingKeywords.push(keyword);
           }
@@ -132,13 +118,13 @@ function makeSmartFixes(type, scoring, params) {
         }
         
         // Add semantic hints
-        if (missingKeywords.includes('dogs') && !params._semanticMatches.some(m => m.keyword === 'dogs')) {
+        if (missingKeywords.includes('dogs') && !semanticMatches.some(m => m.keyword === 'dogs')) {
           semanticHints.push('Use "no dogs" or "dog-free" explicitly');
         }
-        if (missingKeywords.includes('scare') && !params._semanticMatches.some(m => m.keyword === 'scare')) {
+        if (missingKeywords.includes('scare') && !semanticMatches.some(m => m.keyword === 'scare')) {
           semanticHints.push('Mention the specific concern about "scaring" or "fear"');
         }
-        if (missingKeywords.includes('devops') && !params._semanticMatches.some(m => m.keyword === 'devops')) {
+        if (missingKeywords.includes('devops') && !semanticMatches.some(m => m.keyword === 'devops')) {
           semanticHints.push('Specifically mention "devops team" or "developers"');
         }
         
@@ -321,18 +307,128 @@ function applySynonyms(type, params, push) {
   }
 }
 
-const attemptMeta = (kind, s, latencyMs) => ({
+const attemptMeta = (kind, s, latencyMs, usage) => ({
   kind,
   trs: s.trs,
   verdict: s.verdict,
-  latency: latencyMs
+  latency: latencyMs,
+  ...(usage ? { calls: usage.calls, tokens: usage.total_tokens } : {})
 });
 
-export async function runPipeline({ type, params, onLog }) {
-  const log = [];
-  const push = (line) => { log.push(line); try { onLog && onLog(line); } catch {} };
+// --- LLM call + token accounting (per call, rolled up per attempt and per run) ---
+function makeMeter() {
+  const calls = [];
+  const sum = (list) => {
+    const out = { calls: list.length, generate_calls: 0, critic_calls: 0, cached_calls: 0,
+      prompt_tokens: 0, completion_tokens: 0, total_tokens: 0, estimated: false };
+    for (const c of list) {
+      out[`${c.kind}_calls`] = (out[`${c.kind}_calls`] || 0) + 1;
+      if (c.cached) out.cached_calls++;
+      out.prompt_tokens += c.prompt_tokens;
+      out.completion_tokens += c.completion_tokens;
+      out.total_tokens += c.total_tokens;
+      if (c.estimated) out.estimated = true;
+    }
+    return out;
+  };
+  return {
+    attempt: 1,
+    calls,
+    record(kind, res) {
+      const u = res?.usage || {};
+      calls.push({
+        kind,
+        attempt: this.attempt,
+        ok: !!res?.ok,
+        cached: !!(res?.cached || res?.coalesced),
+        prompt_tokens: Number(u.prompt_tokens) || 0,
+        completion_tokens: Number(u.completion_tokens) || 0,
+        total_tokens: Number(u.total_tokens) || 0,
+        ...(u.estimated ? { estimated: true } : {})
+      });
+    },
+    forAttempt(n) { return sum(calls.filter(c => c.attempt === n)); },
+    total() { return sum(calls); }
+  };
+}
+
+// Surfaces llmClient's fail-fast circuit state on the report so callers (browser_runner) can pause
+const circuitInfo = (g) => g?.circuit_open ? { circuit_open: true, retry_in_ms: g.retry_in_ms } : {};
+
+const usageLine = (u) =>
+  `🧾 Usage: ${u.calls} LLM calls (gen ${u.generate_calls}, critic ${u.critic_calls}${u.cached_calls ? `, cached ${u.cached_calls}` : ''}) — ` +
+  `${u.total_tokens} tokens (prompt ${u.prompt_tokens}, completion ${u.completion_tokens})${u.estimated ? ' (estimated)' : ''}.`;
+
+// --- Structured run log: typed, leveled events; text is only built when a sink reads it ---
+// Event = { at (ms since start), level, kind, text() } — text() formats lazily and memoizes.
+// Events below the run's level are dropped outright; onEvent(ev) sees the rest, onLog(line)
+// forces their text. report.log keeps the last `keep` lines (?log_keep, default 500; 0 = none).
+const LOG_LEVELS = { debug: 10, info: 20, warn: 30, error: 40 };
+const LOG_KEEP_DEFAULT = 500;
+
+function logSettings() {
+  try {
+    const usp = new URLSearchParams(globalThis.location.search);
+    const keep = Number(usp.get('log_keep'));
+    return {
+      keep: usp.has('log_keep') && Number.isFinite(keep) ? Math.max(0, Math.floor(keep)) : LOG_KEEP_DEFAULT,
+      level: LOG_LEVELS[usp.get('log_level')] ? usp.get('log_level') : null
+    };
+  } catch { return { keep: LOG_KEEP_DEFAULT, level: null }; }
+}
+
+function makeRunLog({ onLog, onEvent, level, keep, startedAt }) {
+  const min = LOG_LEVELS[level] ?? LOG_LEVELS.info;
+  const kept = [];
+  let dropped = 0;
+  const emit = (lvl) => (kind, msg) => {
+    if (LOG_LEVELS[lvl] < min) return;
+    if (!onLog && !onEvent && keep <= 0) return; // nobody will ever read it
+    let text = null;
+    const ev = {
+      at: Date.now() - startedAt, level: lvl, kind,
+      text: () => (text ??= String(typeof msg === 'function' ? msg() : msg))
+    };
+    if (keep > 0) {
+      kept.push(ev);
+      if (kept.length > keep) { kept.shift(); dropped++; }
+    }
+    if (onEvent) { try { onEvent(ev); } catch {} }
+    if (onLog) { try { onLog(ev.text()); } catch {} }
+  };
+  return {
+    debug: emit('debug'), info: emit('info'), warn: emit('warn'), error: emit('error'),
+    lines() {
+      const out = kept.map(ev => ev.text());
+      if (dropped) out.unshift(`… ${dropped} earlier log line${dropped === 1 ? '' : 's'} dropped (log_keep=${keep})`);
+      return out;
+    }
+  };
+}
+
+// `signal` (optional) lets the caller cancel the run; the deadline aborts everything after attempt #1's generation.
+// `verbose` overrides the dev toggle (the pipeline worker can't see the page's window).
+// `logLevel` / `logKeep` / `onEvent`: see the structured run log above. Batch callers that only
+// need scores can pass logKeep: 0 and no onLog to skip log formatting entirely.
+export async function runPipeline({ type, params, onLog, onToken, signal, verbose, logLevel, logKeep, onEvent }) {
+  // Streamed deltas (only when llmClient streams): onToken(textSoFar, { attempt })
+  const tokenSink = (attempt) => onToken
+    ? (_delta, text) => { try { onToken(text, { attempt }); } catch {} }
+    : undefined;
   const startedAt = Date.now();
-  const VERBOSE = isVerbose();
+  const VERBOSE = verbose ?? isVerbose();
+  const logCfg = logSettings();
+  const rlog = makeRunLog({
+    onLog, onEvent, startedAt,
+    level: logLevel ?? logCfg.level ?? (VERBOSE ? 'debug' : 'info'),
+    keep: logKeep ?? logCfg.keep
+  });
+  const note = (line) => rlog.info('normalize', line); // applySynonyms' logger
+  const meter = makeMeter();
+  const deadline = makeDeadline(maxDurationMs(), signal);
+  const timedOut = () => {
+    rlog.warn('deadline', `⏰ Deadline reached (${Date.now() - startedAt}ms of ${deadline.ms}ms) — cancelled in-flight LLM calls.`);
+  };
 
   try {
     // 0) Normalize (locale/defaults)
@@ -340,48 +436,49 @@ export async function runPipeline({ type, params, onLog }) {
 
     // 1) Policy + synonym mapping + validation
     const policy = getPolicy(type);
-    push(`📦 Policy loaded for ${labelFor(type)} — required=[${(policy.required || []).join(', ')}], thresholds pass≥${policy.thresholds.trs_pass}/border≥${policy.thresholds.trs_border}`);
+    rlog.info('policy', () => `📦 Policy loaded for ${labelFor(type)} — required=[${(policy.required || []).join(', ')}], thresholds pass≥${policy.thresholds.trs_pass}/border≥${policy.thresholds.trs_border}`);
 
     // Map common aliases BEFORE required check
-    applySynonyms(type, params, push);
+    applySynonyms(type, params, note);
 
     const v = validateRequired(type, params);
     if (!v.ok) {
       const miss = v.missing.join(', ');
-      push(`❌ Missing required: ${miss}`);
-      return { ok: false, log, error: `Missing required: ${miss}` };
+      rlog.error('validate', `❌ Missing required: ${miss}`);
+      return { ok: false, log: rlog.lines(), error: `Missing required: ${miss}` };
     }
-    push('✔️ Required OK.');
+    rlog.info('validate', '✔️ Required OK.');
 
     if (params?.draft && String(params.draft).trim().length > 0) {
       const d = String(params.draft).trim();
-      push(`📝 Draft provided (${Math.min(120, d.length)}ch): "${d.slice(0, 120)}${d.length > 120 ? '…' : ''}"`);
+      rlog.info('input', () => `📝 Draft provided (${Math.min(120, d.length)}ch): "${d.slice(0, 120)}${d.length > 120 ? '…' : ''}"`);
     }
 
     // 2) Corpus + refs + merged lexicon
     const traits = getTraits(type, params);
     const { matchOn = [], refs: refsN = 3 } = policy.corpus || {};
-    const corpus = await loadCorpusWithLexicon(policy);
-    if (corpus?.error) push(`⚠️ Corpus load error: ${corpus.error}`);
+    const corpus = await loadCorpusWithLexicon(policy, params);
+    if (corpus?.error) rlog.warn('corpus', `⚠️ Corpus load error: ${corpus.error}`);
+    if (corpus?.shards) rlog.info('corpus', `🗂️ Corpus shards: ${corpus.shards.length} (${corpus.examples.length} examples).`);
 
     const refs = pickRefs(corpus, matchOn, params, refsN);
     const intentPack = getIntentLexicon(type, params.intent_canonical || params.intent);
     const preferredAll = Array.from(new Set([...(corpus?.preferred_lexicon || []), ...(intentPack?.preferred || [])]));
     const bannedAll    = Array.from(new Set([...(corpus?.banned_lexicon || []),   ...(intentPack?.banned || [])]));
 
-    push(`📚 Picked ${refs.length} on-voice refs (matchOn: ${matchOn.join(', ') || '—'}).`);
-    push(`🔤 Lexicon merged — preferred ${preferredAll.length}, banned ${bannedAll.length}.`);
-    push(`🧪 Traits: ${compactTraits(traits)}`);
+    rlog.info('refs', `📚 Picked ${refs.length} on-voice refs (matchOn: ${matchOn.join(', ') || '—'}).`);
+    rlog.info('lexicon', `🔤 Lexicon merged — preferred ${preferredAll.length}, banned ${bannedAll.length}.`);
+    rlog.info('traits', () => `🧪 Traits: ${compactTraits(traits)}`);
     if (VERBOSE && Array.isArray(refs) && refs.length > 0) {
-      try {
+      rlog.debug('refs', () => {
         const refLines = refs.map((r, i) => {
           const id = r?.id || r?.ref_id || `ref#${i + 1}`;
           const text = String(r?.text || r?.body || r?.headline || '')
             .replace(/\s+/g, ' ').trim();
           return `  • ${id} — ${snip(text, 160)}`;
         });
-        push(`📎 Refs selected:\n${refLines.join('\n')}`);
-      } catch {}
+        return `📎 Refs selected:\n${refLines.join('\n')}`;
+      });
     }
 
     // 3) Generate initial
@@ -395,52 +492,89 @@ export async function runPipeline({ type, params, onLog }) {
     });
 
     if (VERBOSE) {
-      push(`🔎 Prompt #1 — SYSTEM\n${tpl1.system}`);
-      push(`🔎 Prompt #1 — USER\n${tpl1.user}`);
+      rlog.debug('prompt', () => `🔎 Prompt #1 — SYSTEM\n${tpl1.system}`);
+      rlog.debug('prompt', () => `🔎 Prompt #1 — USER\n${tpl1.user}`);
     } else {
-      push(`🔎 Prompt #1 — SYSTEM: ${snip(tpl1.system, 220)}`);
-      push(`🔎 Prompt #1 — USER: ${snip(tpl1.user, 220)}`);
+      rlog.info('prompt', () => `🔎 Prompt #1 — SYSTEM: ${snip(tpl1.system, 220)}`);
+      rlog.info('prompt', () => `🔎 Prompt #1 — USER: ${snip(tpl1.user, 220)}`);
     }
-
-    push(`🧠 Generating (attempt #1)…`);
-    const g1 = await generateText({ system: tpl1.system, user: tpl1.user, max_tokens: type === 'microcopy' ? 120 : 700 });
-    if (!g1.ok) {
-      const msg = `LLM error: ${g1.error || 'unknown'}`;
-      push(`❌ ${msg}`);
-      return { ok: false, log, error: msg };
+    rlog.info('budget', () => budgetLine('#1', tpl1));
+
+    const stopWhen = earlyStopFor(type, params);
+    const replied = (tag, g) => {
+      const ttft = g.ttft_ms != null ? `, first token ~${g.ttft_ms}ms` : '';
+      rlog.info('reply', `✅ Model ${tag} replied in ~${g.latency_ms ?? '?'}ms${ttft}${g.hedged ? ' (hedged)' : ''}.`);
+      if (g.stopped_early) rlog.info('reply', `✂️ Early stop ${tag} after ${g.text.length}ch (enough text for the output shape).`);
+    };
+
+    const nCand = candidateCount();
+    rlog.info('generate', nCand > 1 ? `🧠 Generating ${nCand} candidates (attempt #1)…` : `🧠 Generating (attempt #1)…`);
+    // Attempt #1 is exempt from the deadline (only the caller's own signal cancels it): a slow but
+    // healthy first generation must still return a draft. The deadline bounds the work after it.
+    const gens = await Promise.all(Array.from({ length: nCand }, (_, k) =>
+      generateText({
+        system: tpl1.system, user: tpl1.user, max_tokens: type === 'microcopy' ? 120 : 700,
+        onToken: tokenSink(nCand > 1 ? `1.${k + 1}` : '1'), stopWhen, signal
+      })
+    ));
+    gens.forEach(g => meter.record('generate', g));
+    const okGens = gens.filter(g => g.ok);
+    if (okGens.length === 0) {
+      const msg = `LLM error: ${gens[0]?.error || 'unknown'}`;
+      rlog.error('error', `❌ ${msg}`);
+      return { ok: false, log: rlog.lines(), error: msg, usage: meter.total(), calls: meter.calls,
+        ...circuitInfo(gens[0]) };
     }
-    push(`✅ Model #1 replied in ~${g1.latency_ms ?? '?'}ms.`);
-    push(`📝 Candidate #1 (raw): “${snip(g1.text)}”`);
-
-    let tBest = enforceOutputShape(type, g1.text, params);
-    if (tBest !== g1.text) push('🧱 Enforced output shape.');
-    push(`📝 Candidate #1 (shaped): “${snip(tBest)}”`);
-
-    let sBest = await scoreTRS({ type, text: tBest, policy, refs, preferred: preferredAll, banned: bannedAll, params });
-    if (!sBest?.ok) {
-      const msg = `TRS/critic error: ${sBest?.error || 'unknown'}`;
-      push(`❌ ${msg}`);
-      return { ok: false, log, error: msg };
+    const shaped = okGens.map((g, k) => {
+      const tag = okGens.length > 1 ? `#1.${k + 1}` : '#1';
+      replied(tag, g);
+      rlog.info('candidate', () => `📝 Candidate ${tag} (raw): “${snip(g.text)}”`);
+      const t = enforceOutputShape(type, g.text, params);
+      if (t !== g.text) rlog.info('shape', '🧱 Enforced output shape.');
+      rlog.info('candidate', () => `📝 Candidate ${tag} (shaped): “${snip(t)}”`);
+      return t;
+    });
+
+    const scoreCtx = { type, policy, refs, preferred: preferredAll, banned: bannedAll, params, meter, signal: deadline.signal };
+    const scored = await scoreCandidates(shaped, scoreCtx);
+    const bad = scored.find(s => !s?.ok);
+    if (bad) {
+      const msg = `TRS/critic error: ${bad?.error || 'unknown'}`;
+      rlog.error('error', `❌ ${msg}`);
+      return { ok: false, log: rlog.lines(), error: msg, usage: meter.total(), calls: meter.calls };
     }
-    push(`🧮 ${scoringLine('#1', sBest)}`);
+    let bestIdx = 0;
+    scored.forEach((s, k) => {
+      if (scored.length > 1) rlog.info('score', () => `🧮 ${scoringLine(`#1.${k + 1}`, s)}`);
+      if (s.trs > scored[bestIdx].trs) bestIdx = k;
+    });
+    const g1 = okGens[bestIdx];
+    let tBest = shaped[bestIdx];
+    let sBest = scored[bestIdx];
+    rlog.info('score', () => `🧮 ${scoringLine('#1', sBest)}`);
+    // the first draft is all we have, so keep it even if its critic call was cut short
+    if (sBest.aborted) rlog.warn('deadline', '⏰ Critic #1 cancelled by the deadline — TRS uses the fallback critic score.');
 
-    const attempts = [attemptMeta('initial', sBest, g1.latency_ms)];
+    const attempts = [attemptMeta('initial', sBest, g1.latency_ms, meter.forAttempt(1))];
 
-    if (sBest.verdict === 'pass') {
+    if (sBest.verdict === 'pass' || deadline.expired) {
+      if (deadline.expired) timedOut();
       const duration_ms = Date.now() - startedAt;
-      push(`🏁 Finished in ${duration_ms}ms (${String(sBest.verdict).toUpperCase()}).`);
-      return { ok: true, log, policy, result: tBest, scoring: sBest, attempts, duration_ms };
+      const usage = meter.total();
+      rlog.info('usage', () => usageLine(usage));
+      rlog.info('done', `🏁 Finished in ${duration_ms}ms (${String(sBest.verdict).toUpperCase()}).`);
+      return { ok: true, log: rlog.lines(), policy, result: tBest, scoring: sBest, attempts, duration_ms, usage, calls: meter.calls,
+        ...(deadline.expired ? { timed_out: true } : {}) };
     }
 
     // 4) Iterative TRS-driven revise loop (for FAIL and BORDERLINE)
     for (let i = 2; i <= MAX_TRIES && (sBest.verdict === 'fail' || sBest.verdict === 'borderline'); i++) {
-      // Check time limit - but allow current iteration to finish
-      const elapsed = Date.now() - startedAt;
-      if (elapsed > MAX_DURATION_MS) {
-        push(`⏰ Time limit reached (${elapsed}ms), stopping after attempt #${i-1}.`);
+      if (deadline.expired) {
+        timedOut();
         break;
       }
-      
+
+      meter.attempt = i;
       const fixes = makeSmartFixes(type, sBest, params);
 
       const tplR = genTemplate_revise({
@@ -455,44 +589,58 @@ export async function runPipeline({ type, params, onLog }) {
       });
 
       if (VERBOSE) {
-        push(`🔎 Prompt #${i} — SYSTEM\n${tplR.system}`);
-        push(`🔎 Prompt #${i} — USER\n${tplR.user}`);
+        rlog.debug('prompt', () => `🔎 Prompt #${i} — SYSTEM\n${tplR.system}`);
+        rlog.debug('prompt', () => `🔎 Prompt #${i} — USER\n${tplR.user}`);
       } else {
-        push(`🔎 Prompt #${i} — SYSTEM: ${snip(tplR.system, 220)}`);
-        push(`🔎 Prompt #${i} — USER: ${snip(tplR.user, 220)}`);
+        rlog.info('prompt', () => `🔎 Prompt #${i} — SYSTEM: ${snip(tplR.system, 220)}`);
+        rlog.info('prompt', () => `🔎 Prompt #${i} — USER: ${snip(tplR.user, 220)}`);
       }
+      rlog.info('budget', () => budgetLine(`#${i}`, tplR));
 
-      push(`🔁 Revise attempt #${i} — fixes: ${fixes.join(' | ')}`);
+      rlog.info('revise', () => `🔁 Revise attempt #${i} — fixes: ${fixes.join(' | ')}`);
 
-      const gR = await generateText({ system: tplR.system, user: tplR.user, max_tokens: type === 'microcopy' ? 120 : 700 });
+      const gR = await generateText({
+        system: tplR.system, user: tplR.user, max_tokens: type === 'microcopy' ? 120 : 700,
+        onToken: tokenSink(String(i)), stopWhen, signal: deadline.signal
+      });
+      meter.record('generate', gR);
+      if (gR.aborted) {
+        timedOut();
+        break;
+      }
       if (!gR.ok) {
         const msg = `Retry LLM error: ${gR.error || 'unknown'}`;
-        push(`❌ ${msg}`);
-        return { ok: false, log, error: msg };
+        rlog.error('error', `❌ ${msg}`);
+        return { ok: false, log: rlog.lines(), error: msg, usage: meter.total(), calls: meter.calls, ...circuitInfo(gR) };
       }
 
-      push(`✅ Model #${i} replied in ~${gR.latency_ms ?? '?'}ms.`);
-      push(`📝 Candidate #${i} (raw): “${snip(gR.text)}”`);
+      replied(`#${i}`, gR);
+      rlog.info('candidate', () => `📝 Candidate #${i} (raw): “${snip(gR.text)}”`);
 
       const tR = enforceOutputShape(type, gR.text, params);
-      if (tR !== gR.text) push('🧱 Enforced output shape (revise).');
-      push(`📝 Candidate #${i} (shaped): “${snip(tR)}”`);
+      if (tR !== gR.text) rlog.info('shape', '🧱 Enforced output shape (revise).');
+      rlog.info('candidate', () => `📝 Candidate #${i} (shaped): “${snip(tR)}”`);
 
-      const sR = await scoreTRS({ type, text: tR, policy, refs, preferred: preferredAll, banned: bannedAll, params });
+      const [sR] = await scoreCandidates([tR], scoreCtx);
+      if (sR?.aborted) {
+        // an unscored revision can't be compared against the best, so drop it
+        timedOut();
+        break;
+      }
       if (!sR?.ok) {
         const msg = `TRS/critic error (#${i}): ${sR?.error || 'unknown'}`;
-        push(`❌ ${msg}`);
-        return { ok: false, log, error: msg };
+        rlog.error('error', `❌ ${msg}`);
+        return { ok: false, log: rlog.lines(), error: msg, usage: meter.total(), calls: meter.calls };
       }
-      push(`🧮 ${scoringLine(`#${i}`, sR)}`);
-      attempts.push(attemptMeta(`revise#${i - 1}`, sR, gR.latency_ms));
+      rlog.info('score', () => `🧮 ${scoringLine(`#${i}`, sR)}`);
+      attempts.push(attemptMeta(`revise#${i - 1}`, sR, gR.latency_ms, meter.forAttempt(i)));
 
       // Always keep the best result (highest TRS score)
       if (sR.trs > sBest.trs) { 
         const improvement = sR.trs - sBest.trs;
         tBest = tR; 
         sBest = sR; 
-        push(`📈 New best: TRS ${sR.trs} (improved by +${improvement} points)`);
+        rlog.info('revise', `📈 New best: TRS ${sR.trs} (improved by +${improvement} points)`);
       }
       if (sBest.verdict === 'pass') break;
     }
@@ -501,19 +649,24 @@ export async function runPipeline({ type, params, onLog }) {
     const finalTRS = sBest.trs;
     const initialTRS = attempts[0]?.trs || 0;
     const improvement = finalTRS - initialTRS;
-    
+    const usage = meter.total();
+    rlog.info('usage', () => usageLine(usage));
+
     if (sBest.verdict === 'pass') {
-      push(`🏁 SUCCESS: Achieved PASS with TRS ${finalTRS} (${improvement > 0 ? `+${improvement}` : improvement} from initial) in ${duration_ms}ms.`);
+      rlog.info('done', `🏁 SUCCESS: Achieved PASS with TRS ${finalTRS} (${improvement > 0 ? `+${improvement}` : improvement} from initial) in ${duration_ms}ms.`);
     } else if (sBest.verdict === 'borderline') {
-      push(`🏁 BORDERLINE: Best TRS ${finalTRS} (${improvement > 0 ? `+${improvement}` : improvement} from initial) in ${duration_ms}ms.`);
+      rlog.info('done', `🏁 BORDERLINE: Best TRS ${finalTRS} (${improvement > 0 ? `+${improvement}` : improvement} from initial) in ${duration_ms}ms.`);
     } else {
-      push(`🏁 FAIL: Best TRS ${finalTRS} after ${attempts.length} attempts (${improvement > 0 ? `+${improvement}` : improvement} improvement) in ${duration_ms}ms.`);
+      rlog.info('done', `🏁 FAIL: Best TRS ${finalTRS} after ${attempts.length} attempts (${improvement > 0 ? `+${improvement}` : improvement} improvement) in ${duration_ms}ms.`);
     }
 
-    return { ok: true, log, policy, result: tBest, scoring: sBest, attempts, duration_ms };
+    return { ok: true, log: rlog.lines(), policy, result: tBest, scoring: sBest, attempts, duration_ms, usage, calls: meter.calls,
+      ...(deadline.expired ? { timed_out: true } : {}) };
 
   } catch (err) {
     const msg = err?.message || String(err);
-    return { ok: false, log, error: msg };
+    return { ok: false, log: rlog.lines(), error: msg };
+  } finally {
+    deadline.clear();
   }
 }
@@ -0,0 +1,103 @@
+// src/pipelineClient.js — runPipeline through a dedicated module Web Worker (src/pipelineWorker.js)
+// Same call shape as orchestrator.runPipeline; logs/previews arrive in batches and are replayed
+// to onLog/onToken. Falls back to running on the main thread when module workers are unavailable,
+// the worker fails to start, or ?worker=0. Several runs can be in flight at once.
+
+// The pipeline itself (orchestrator.js and its imports) only loads on the page for the fallback.
+function runInPage(args) {
+  return import('./orchestrator.js')
+    .then(m => m.runPipeline(args))
+    .catch(err => ({ ok: false, log: [], error: err?.message || String(err) }));
+}
+
+let _worker = null;      // Worker | false (unavailable) | null (not tried yet)
+let _ready = false;      // the worker posted 'ready', i.e. its module graph loaded
+let _seq = 0;
+const _pending = new Map(); // id -> { onLog, onToken, resolve }
+
+function workerDisabled() {
+  try { return new URLSearchParams(location.search).get('worker') === '0'; } catch { return false; }
+}
+
+// Module workers are detected by whether the constructor reads options.type
+function supportsModuleWorker() {
+  if (typeof Worker === 'undefined') return false;
+  let supported = false;
+  try {
+    const w = new Worker('data:text/javascript,', { get type() { supported = true; return 'module'; } });
+    w.terminate();
+  } catch {}
+  return supported;
+}
+
+function getWorker() {
+  if (_worker !== null) return _worker;
+  if (workerDisabled() || !supportsModuleWorker()) return (_worker = false);
+  try {
+    const url = new URL(`./pipelineWorker.js${location.search}`, import.meta.url);
+    const w = new Worker(url, { type: 'module' });
+    w.onmessage = onMessage;
+    w.onerror = (e) => {
+      if (_ready) {
+        // a stray error in a running worker: each run still reports its own outcome ('done')
+        console.warn('[pipeline] worker error:', e?.message || e);
+        e?.preventDefault?.();
+        return;
+      }
+      // startup/import failure: no run reached the worker, so finish them in-thread and stop using it
+      console.warn('[pipeline] worker failed to start, running on the main thread:', e?.message || e);
+      try { w.terminate(); } catch {}
+      _worker = false;
+      for (const [id, p] of _pending) {
+        _pending.delete(id);
+        runInPage(p.args).then(p.resolve);
+      }
+    };
+    _worker = w;
+  } catch {
+    _worker = false;
+  }
+  return _worker;
+}
+
+function onMessage(e) {
+  const { id, kind, lines, preview, report } = e.data || {};
+  if (kind === 'ready') { _ready = true; return; }
+  const p = _pending.get(id);
+  if (!p) return;
+  if (kind === 'batch') {
+    for (const line of lines || []) { try { p.onLog && p.onLog(line); } catch {} }
+    if (preview != null) { try { p.onToken && p.onToken(preview); } catch {} }
+  } else if (kind === 'done') {
+    _pending.delete(id);
+    p.resolve(report);
+  }
+}
+
+function verboseFlag() {
+  try {
+    if (window.__DEV_VERBOSE === true) return true;
+    const usp = new URLSearchParams(location.search);
+    return usp.has('verbose') && usp.get('verbose') !== '0';
+  } catch { return false; }
+}
+
+// runPipeline({ type, params, onLog, onToken, signal }) → Promise<report>
+export function runPipeline(args = {}) {
+  const w = getWorker();
+  if (!w) return runInPage(args);
+
+  const { type, params, onLog, onToken, signal } = args;
+  const id = ++_seq;
+  return new Promise((resolve) => {
+    _pending.set(id, { onLog, onToken, resolve, args });
+    try {
+      w.postMessage({ cmd: 'run', id, type, params: { ...params }, verbose: verboseFlag() });
+    } catch (err) {
+      // e.g. params that can't be structured-cloned: fail this run only
+      _pending.delete(id);
+      return resolve({ ok: false, log: [], error: `Could not start the run: ${err?.message || err}` });
+    }
+    signal?.addEventListener('abort', () => w.postMessage({ cmd: 'cancel', id }), { once: true });
+  });
+}
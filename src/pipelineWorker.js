@@ -0,0 +1,58 @@
+// src/pipelineWorker.js — runs runPipeline off the main thread (spawned by pipelineClient.js)
+// The worker URL carries the page's query string, so ?endpoint, ?stream, ?candidates … apply here too.
+// Protocol (postMessage):
+//   in : { cmd: 'run', id, type, params, verbose }   |   { cmd: 'cancel', id }
+//   out: { kind: 'ready' }  (once, after the module graph loaded)
+//        { id, kind: 'batch', lines: string[], preview: string|null }  (log lines + latest streamed draft)
+//        { id, kind: 'done', report }
+
+import { runPipeline } from './orchestrator.js';
+
+const FLUSH_MS = 50; // log/preview batching window
+const _runs = new Map(); // id -> AbortController
+
+function batcher(id) {
+  let lines = [], preview = null, timer = null;
+  const flush = () => {
+    if (timer) { clearTimeout(timer); timer = null; }
+    if (!lines.length && preview == null) return;
+    self.postMessage({ id, kind: 'batch', lines, preview });
+    lines = [];
+    preview = null;
+  };
+  const schedule = () => { if (!timer) timer = setTimeout(flush, FLUSH_MS); };
+  return {
+    log(line) { lines.push(line); schedule(); },
+    token(text) { preview = text; schedule(); },
+    flush,
+  };
+}
+
+async function run({ id, type, params, verbose }) {
+  const ctrl = new AbortController();
+  _runs.set(id, ctrl);
+  const out = batcher(id);
+  let report;
+  try {
+    report = await runPipeline({
+      type, params, verbose,
+      signal: ctrl.signal,
+      onLog: out.log,
+      onToken: out.token
+    });
+  } catch (err) {
+    report = { ok: false, log: [], error: err?.message || String(err) };
+  } finally {
+    _runs.delete(id);
+  }
+  out.flush();
+  self.postMessage({ id, kind: 'done', report });
+}
+
+self.onmessage = (e) => {
+  const msg = e.data || {};
+  if (msg.cmd === 'run') run(msg);
+  else if (msg.cmd === 'cancel') _runs.get(msg.id)?.abort(new Error('cancelled'));
+};
+
+self.postMessage({ kind: 'ready' });
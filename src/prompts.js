@@ -1,6 +1,27 @@
 // src/prompts.js
 // Build OpenAI-format prompts for initial generate and targeted revise.
 // Emphasizes "NO PREFACE" and "return only final text" to avoid scaffolding.
+// Prompts are kept within a per-type token budget: duplicate lines/fixes are dropped,
+// and lexicon lists, refs and fixes are capped by relevance, tighter at each level.
+
+// ~tokens for system + user (chars/4 estimate); revise prompts carry the base text + fixes
+const PROMPT_BUDGET = {
+  microcopy:      { generate: 360, revise: 480 },
+  internal_comms: { generate: 560, revise: 640 },
+  press_release:  { generate: 600, revise: 680 },
+};
+const DEFAULT_BUDGET = { generate: 600, revise: 680 };
+
+// Compaction levels, tried in order until the prompt fits its budget
+const COMPACTION = [
+  { prefer: 16, avoid: 16, refs: 3, refChars: 240, fixes: 6 },
+  { prefer: 10, avoid: 12, refs: 2, refChars: 200, fixes: 5 },
+  { prefer: 6,  avoid: 8,  refs: 1, refChars: 160, fixes: 4 },
+];
+
+export function estimateTokens(text) {
+  return Math.ceil(String(text || '').length / 4);
+}
 
 function lexiconLines(preferred = [], banned = []) {
   const p = preferred.filter(Boolean);
@@ -29,18 +50,31 @@ function noPrefaceGuards(extra = '') {
   ].filter(Boolean).join(' ');
 }
 
-function refsBlock(refs = []) {
+function refsBlock(refs = [], level = COMPACTION[0]) {
   if (!Array.isArray(refs) || refs.length === 0) return '';
-  const lines = refs.slice(0, 3).map(r => {
+  // refs arrive ranked by pickRefs, so the cap keeps the most relevant ones
+  const lines = refs.slice(0, level.refs).map(r => {
     const id = r?.id || r?.ref_id || 'ref';
-    const text = (r?.text || '').replace(/\s+/g, ' ').trim();
+    const text = clip((r?.text || '').replace(/\s+/g, ' ').trim(), level.refChars);
     return `• ${id} — ${text}`;
   });
   return `VOICE & EXAMPLES (for style, not content):\n${lines.join('\n')}`;
 }
 
-export function genTemplate_generate({ type, traits, params, refs, preferred, banned }) {
-  const sys = [systemCommon(traits), lexiconLines(preferred, banned), noPrefaceGuards()].filter(Boolean).join('\n');
+export function genTemplate_generate(args) {
+  return withBudget(args.type, 'generate', (level) => buildGenerate(args, level));
+}
+
+export function genTemplate_revise(args) {
+  return withBudget(args.type, 'revise', (level) => buildRevise(args, level));
+}
+
+function buildGenerate({ type, traits, params, refs, preferred = [], banned = [] }, level) {
+  const sys = [
+    systemCommon(traits),
+    lexiconLines(rankLexicon(preferred, params).slice(0, level.prefer), (banned || []).slice(0, level.avoid)),
+    noPrefaceGuards()
+  ].filter(Boolean).join('\n');
 
   if (type === 'microcopy') {
     const uiContext = params?.uiContext || 'button';
@@ -72,7 +106,7 @@ TOOLTIP REQUIREMENTS:
 UI CONTEXT: ${uiContext}
 SURFACE: ${params?.surface || uiContext}
 INTENT: ${params?.intent_canonical || params?.intent || 'generic'}
-${refsBlock(refs)}
+${refsBlock(refs, level)}
 REQUIREMENTS:${contextRequirements}
 - CRITICAL: The generated content MUST directly address and match the specific INTENT.
 - Use only words essential to the INTENT; avoid adding adverbs or qualifiers unless present in INTENT.
@@ -91,7 +125,7 @@ LOCALE: ${params?.locale || 'en-US'}
 TITLE: ${params?.title || ''}
 KEY UPDATE: ${params?.key_update || ''}
 ${lexiconLines([], params?.banned || [])}
-${refsBlock(refs)}
+${refsBlock(refs, level)}
 REQUIREMENTS:
 - If CHANNEL is Slack: Keep it to 1–2 short lines; crisp; no emoji or slang. DO NOT include the title as a header - start directly with the message content.
 - If CHANNEL is Email: Start with the TITLE on its own line, then a blank line, then the body; professional, friendly.
@@ -116,7 +150,7 @@ OUTPUT: Only the final text for the specified channel.`;
 AUDIENCE: ${params?.audience || 'press'}
 HEADLINE: ${params?.headline || ''}
 KEY MESSAGE: ${params?.key_message || ''}
-${refsBlock(refs)}
+${refsBlock(refs, level)}
 REQUIREMENTS:
 - Factual tone; avoid consumer CTA language.
 - CRITICAL: You MUST include the specific content from HEADLINE and KEY MESSAGE in your response.
@@ -132,9 +166,13 @@ OUTPUT: Only the final text.`;
   return { system: sys, user: `TASK: ${type}\n${noPrefaceGuards('')}\nOUTPUT: Only the final text.` };
 }
 
-export function genTemplate_revise({ type, traits, params, refs, preferred, banned, base, fixes = [] }) {
-  const sys = [systemCommon(traits), lexiconLines(preferred, banned), noPrefaceGuards()].filter(Boolean).join('\n');
-  const fixLines = (fixes || []).map((f, i) => `  ${i + 1}. ${f}`).join('\n');
+function buildRevise({ type, traits, params, refs, preferred = [], banned = [], base, fixes = [] }, level) {
+  const sys = [
+    systemCommon(traits),
+    lexiconLines(rankLexicon(preferred, params).slice(0, level.prefer), (banned || []).slice(0, level.avoid)),
+    noPrefaceGuards()
+  ].filter(Boolean).join('\n');
+  const fixLines = dedupeFixes(fixes).slice(0, level.fixes).map((f, i) => `  ${i + 1}. ${f}`).join('\n');
   const localeLine = (type === 'microcopy') ? '' : `\nLOCALE: ${params?.locale || 'en-US'}`;
 
   // CRITICAL: Include original user request context to prevent content drift
@@ -184,7 +222,7 @@ CRITICAL INSTRUCTIONS:
 - Do NOT generate completely new content
 - Do NOT generate content for multiple channels
 
-${refsBlock(refs)}
+${refsBlock(refs, level)}
 OUTPUT: Only the final text (no preface, no labels, no fences).`;
 
   return { system: sys, user: task };
@@ -199,3 +237,70 @@ function keywordList(a = '', b = '') {
   for (const w of tokens) if (!uniq.includes(w)) uniq.push(w);
   return uniq.slice(0, 8).join(', ');
 }
+
+function clip(s, n) {
+  return s.length > n ? s.slice(0, n - 1).trimEnd() + '…' : s;
+}
+
+function queryWords(params = {}) {
+  const raw = ['intent_canonical', 'intent', 'uiContext', 'title', 'key_update', 'headline', 'key_message']
+    .map(k => params?.[k]).filter(v => typeof v === 'string').join(' ');
+  return raw.toLowerCase().replace(/[^a-z0-9\s]/g, ' ').split(/\s+/).filter(w => w.length >= 2);
+}
+
+// Lexicon terms that overlap the request first (whole phrase > any word), then original order
+function rankLexicon(list = [], params = {}) {
+  const words = new Set(queryWords(params));
+  const blob = ` ${[...words].join(' ')} `;
+  const score = (term) => {
+    const t = String(term).toLowerCase();
+    if (blob.includes(` ${t} `)) return 2;
+    return t.split(/\s+/).some(w => words.has(w)) ? 1 : 0;
+  };
+  return (list || [])
+    .filter(Boolean)
+    .map((term, i) => ({ term, i, s: score(term) }))
+    .sort((a, b) => (b.s - a.s) || (a.i - b.i))
+    .map(x => x.term);
+}
+
+function dedupeFixes(fixes = []) {
+  const seen = new Set();
+  return (fixes || []).filter(f => {
+    const k = String(f || '').toLowerCase().replace(/\s+/g, ' ').trim();
+    if (!k || seen.has(k)) return false;
+    seen.add(k);
+    return true;
+  });
+}
+
+// Drop user lines that repeat a system line or an earlier user line (case-insensitive).
+// The quoted CURRENT TEXT block is left untouched.
+function dedupeLines(system, user) {
+  const key = (l) => l.toLowerCase().replace(/\s+/g, ' ').trim();
+  const seen = new Set(String(system || '').split('\n').map(key).filter(Boolean));
+  let quoted = false;
+  const out = [];
+  for (const line of String(user || '').split('\n')) {
+    if (line.trim() === '"""') { quoted = !quoted; out.push(line); continue; }
+    const k = key(line);
+    if (quoted || !k || /^[A-Z ]+:$/.test(line.trim())) { out.push(line); continue; }
+    if (seen.has(k)) continue;
+    seen.add(k);
+    out.push(line);
+  }
+  return out.join('\n').replace(/\n{3,}/g, '\n\n');
+}
+
+function withBudget(type, kind, build) {
+  const budget = (PROMPT_BUDGET[type] || DEFAULT_BUDGET)[kind];
+  let out = null;
+  for (let i = 0; i < COMPACTION.length; i++) {
+    const { system, user } = build(COMPACTION[i]);
+    const compact = dedupeLines(system, user);
+    const tokens = estimateTokens(system) + estimateTokens(compact);
+    out = { system, user: compact, tokens, budget, compaction: i };
+    if (tokens <= budget) break;
+  }
+  return out;
+}
@@ -73,15 +73,196 @@ export function onFormInput(cb){
   form.addEventListener('change', () => cb());
 }
 
-// Simple log helper (panel initially hidden; main.js will unhide when Generate is pressed)
+// Log panel (initially hidden; main.js will unhide when Generate is pressed).
+// Lines are buffered and flushed once per animation frame, and only the rows in view (plus
+// overscan) exist in the DOM. Multi-line entries — verbose prompts — render as a one-line
+// summary that expands on click. Row heights are measured once and cached per entry.
+const LOG_OVERSCAN_PX = 300;
+const LOG_FOLLOW_SLACK_PX = 24; // "at the bottom" tolerance for auto-scroll
+const _log = { entries: [], frame: 0, follow: true, est: 27, panel: null, view: null };
+
 export function log(message){
-  const panel = document.getElementById('log-panel');
-  const line = document.createElement('div');
-  line.className = 'log-line';
   const ts = new Date().toLocaleTimeString();
-  line.textContent = `[${ts}] ${message}`;
-  panel.appendChild(line);
-  panel.scrollTop = panel.scrollHeight;
+  const text = String(message);
+  const nl = text.indexOf('\n');
+  _log.entries.push(nl < 0
+    ? { text: `[${ts}] ${text}`, h: 0 }
+    : { block: true, head: `[${ts}] ${text.slice(0, nl)}`, body: text.slice(nl + 1),
+        lines: text.split('\n').length - 1, open: false, h: 0 });
+  scheduleLog();
+}
+
+export function clearLog(){
+  _log.entries = [];
+  _log.follow = true;
+  scheduleLog();
+}
+
+// Other modules log without importing ui.js
+if (typeof document !== 'undefined') {
+  document.addEventListener('lemonade:log', (e) => log(e.detail));
+}
+
+// --- Dev verbose toggle ---
+// "Verbose prompts" checkbox above the log panel, mirrored to ?verbose=1 (read by pipelineClient.js
+// for worker runs and by orchestrator.js for in-page runs).
+function isVerbose() {
+  try {
+    if (window.__DEV_VERBOSE === true) return true;
+    const usp = new URLSearchParams(window.location.search);
+    return usp.has('verbose') && usp.get('verbose') !== '0';
+  } catch { return false; }
+}
+function setVerbose(v) {
+  try {
+    window.__DEV_VERBOSE = !!v;
+    const usp = new URLSearchParams(window.location.search);
+    if (v) usp.set('verbose', '1'); else usp.delete('verbose');
+    const url = `${location.pathname}?${usp.toString()}${location.hash || ''}`.replace(/\?$/, '');
+    history.replaceState(null, '', url);
+    log(`[dev] Verbose prompts: ${v ? 'ON' : 'OFF'}`);
+  } catch {}
+}
+function injectVerboseToggleOnce() {
+  if (typeof window === 'undefined') return;
+  if (window.__VERBOSE_CTRL_INIT__) return;
+  window.__VERBOSE_CTRL_INIT__ = true;
+
+  document.addEventListener('DOMContentLoaded', () => {
+    const logPanel = document.getElementById('log-panel');
+    if (!logPanel) return;
+
+    const bar = document.createElement('div');
+    bar.id = 'log-dev-controls';
+    bar.style.display = 'flex';
+    bar.style.alignItems = 'center';
+    bar.style.gap = '12px';
+    bar.style.margin = '8px 0';
+
+    const label = document.createElement('label');
+    label.style.display = 'inline-flex';
+    label.style.alignItems = 'center';
+    label.style.gap = '6px';
+    label.style.cursor = 'pointer';
+
+    const cb = document.createElement('input');
+    cb.type = 'checkbox';
+    cb.id = 'toggle-verbose-prompts';
+    cb.checked = isVerbose();
+    cb.addEventListener('change', () => setVerbose(cb.checked));
+
+    const span = document.createElement('span');
+    span.textContent = 'Verbose prompts';
+    span.title = 'Show full SYSTEM + USER prompts in the log. Toggle off to show short snippets.';
+
+    label.appendChild(cb);
+    label.appendChild(span);
+    bar.appendChild(label);
+
+    const parent = logPanel.parentElement || logPanel;
+    parent.insertBefore(bar, logPanel);
+
+    setVerbose(cb.checked);
+  });
+}
+injectVerboseToggleOnce();
+
+function scheduleLog(){
+  if (_log.frame) return;
+  const raf = typeof requestAnimationFrame === 'function' ? requestAnimationFrame : (cb) => setTimeout(cb, 16);
+  _log.frame = raf(() => { _log.frame = 0; renderLog(); });
+}
+
+function logView(){
+  const panel = document.getElementById('log-panel');
+  if (!panel) return null;
+  if (_log.panel !== panel) {
+    _log.panel = panel;
+    panel.textContent = '';
+    _log.view = document.createElement('div');
+    _log.view.className = 'log-window';
+    panel.appendChild(_log.view);
+    panel.addEventListener('scroll', () => {
+      _log.follow = panel.scrollTop + panel.clientHeight >= panel.scrollHeight - LOG_FOLLOW_SLACK_PX;
+      scheduleLog();
+    }, { passive: true });
+    _log.view.addEventListener('click', (e) => {
+      const row = e.target.closest('.log-line--block');
+      const entry = row && _log.entries[Number(row.dataset.i)];
+      if (!entry || e.target.closest('.log-block-body')) return; // let users select prompt text
+      entry.open = !entry.open;
+      entry.h = 0;
+      _log.follow = false;
+      scheduleLog();
+    });
+    window.addEventListener('resize', () => { _log.entries.forEach(x => { x.h = 0; }); scheduleLog(); });
+  }
+  return _log.view;
+}
+
+function logRow(entry, i){
+  const row = document.createElement('div');
+  row.dataset.i = i;
+  if (!entry.block) {
+    row.className = 'log-line';
+    row.textContent = entry.text;
+    return row;
+  }
+  row.className = `log-line log-line--block${entry.open ? ' open' : ''}`;
+  const head = document.createElement('div');
+  head.className = 'log-block-head';
+  head.textContent = `${entry.open ? '▾' : '▸'} ${entry.head} (${entry.lines} more line${entry.lines === 1 ? '' : 's'})`;
+  row.appendChild(head);
+  if (entry.open) {
+    const body = document.createElement('pre');
+    body.className = 'log-block-body mono';
+    body.textContent = entry.body;
+    row.appendChild(body);
+  }
+  return row;
+}
+
+function renderLog(){
+  const view = logView();
+  if (!view) return;
+  const panel = _log.panel;
+  const list = _log.entries;
+  const hOf = (x) => x.h || _log.est;
+
+  const offsets = new Array(list.length);
+  let total = 0;
+  for (let i = 0; i < list.length; i++) { offsets[i] = total; total += hOf(list[i]); }
+
+  const height = panel.clientHeight;
+  const top = (_log.follow ? Math.max(0, total - height) : panel.scrollTop) - LOG_OVERSCAN_PX;
+  const bottom = top + height + 2 * LOG_OVERSCAN_PX;
+  let first = 0, lo = 0, hi = list.length - 1;
+  while (lo <= hi) { // first row whose bottom edge is below `top`
+    const mid = (lo + hi) >> 1;
+    if (offsets[mid] + hOf(list[mid]) > top) { first = mid; hi = mid - 1; } else lo = mid + 1;
+  }
+  let last = first;
+  while (last < list.length && offsets[last] < bottom) last++;
+
+  const frag = document.createDocumentFragment();
+  for (let i = first; i < last; i++) frag.appendChild(logRow(list[i], i));
+  view.replaceChildren(frag);
+
+  // measure what we rendered (one layout per frame), then size the spacers
+  let changed = false;
+  [...view.children].forEach((row) => {
+    const entry = list[Number(row.dataset.i)];
+    const h = row.offsetHeight;
+    if (h > 0 && h !== entry.h) { entry.h = h; changed = true; if (!entry.block) _log.est = h; }
+  });
+  const before = offsets[first] || 0;
+  let after = 0;
+  for (let i = last; i < list.length; i++) after += hOf(list[i]);
+  view.style.paddingTop = `${before}px`;
+  view.style.paddingBottom = `${after}px`;
+
+  if (_log.follow) panel.scrollTop = panel.scrollHeight;
+  if (changed) scheduleLog(); // settle spacers with the measured heights
 }
 
 // ---- small field factories ----
@@ -158,6 +158,34 @@ export function enforceOutputShape(type, text, params = {}) {
   return t || text || '';
 }
 
+/**
+ * Early-stop predicate for streamed generations, or null when the full reply is needed.
+ * Mirrors enforceOutputShape: it only fires once the text that shaping would keep
+ * has fully arrived.
+ * - microcopy/error, microcopy/tooltip: first sentence is complete
+ * - microcopy/button: first line or a closed quoted span is complete
+ * - internal_comms / press_release: never (full prose is kept)
+ */
+export function earlyStopFor(type, params = {}) {
+  if (type !== 'microcopy') return null;
+  const uiContext = params?.uiContext || 'button';
+
+  if (uiContext === 'error' || uiContext === 'tooltip') {
+    return (text) => {
+      const t = stripScaffolding(stripCodeFences(String(text || '')));
+      // a finished sentence followed by more output (so "e.g." style splits are rare)
+      return /\S[^.!?]*\s\S+[.!?]["”’']?\s+\S/.test(t);
+    };
+  }
+
+  return (text) => {
+    const t = String(text || '').replace(/^\s*```[a-z]*\s*/i, '');
+    if (/["“][^"“”]+["”]/.test(t)) return true;
+    const firstLine = t.split('\n')[0];
+    return t.includes('\n') && firstLine.trim().length > 0 && !/:\s*$/.test(firstLine);
+  };
+}
+
 // ---------- Sanitizers & helpers ----------
 
 function stripCodeFences(s) {
@@ -0,0 +1,181 @@
+// sw.js — service worker: offline app shell + corpus cache (registered by src/main.js)
+// - App shell (index.html, styles, logo, src/*.js): precached on install. Pages and ES modules
+//   (src/*.js, dist/**.js, the pipeline worker) are network-first with the cache as the offline
+//   fallback, so a load never mixes modules from two deploys and never runs last deploy's code.
+//   Styles and the logo are served stale-while-revalidate.
+// - Corpus JSON + corpus/dist/manifest.json: stale-while-revalidate. Requests that carry
+//   If-None-Match/If-Modified-Since (corpus.js revalidation) go to the network first.
+// - Hashed shards (corpus/dist/<name>.<hash12>.json from build_corpus.py) never change: cache-first,
+//   precached from the manifest, and pruned once the manifest stops listing them.
+// - Everything else (LLM calls, other origins, non-GET) is left to the network.
+// Query strings are ignored for shell files (index.html?type=…, pipelineWorker.js?…).
+// The optional bundled build (build_bundle.py: index.bundle.html + dist/) is treated as shell too.
+// Bump VERSION when the SHELL list changes (cached contents refresh on their own). ?sw=0 on the
+// page unregisters the worker.
+
+const VERSION = 'v2';
+const SHELL_CACHE = `lemonade-shell-${VERSION}`;
+const CORPUS_CACHE = 'lemonade-corpus';
+const MANIFEST = './corpus/dist/manifest.json';
+
+const SHELL = [
+  './index.html',
+  './styles.css',
+  './assets/logo.svg',
+  './src/main.js',
+  './src/ui.js',
+  './src/kpis.js',
+  './src/feedbackDb.js',
+  './src/pipelineClient.js',
+  './src/pipelineWorker.js',
+  './src/orchestrator.js',
+  './src/policy.js',
+  './src/prompts.js',
+  './src/util.js',
+  './src/llmClient.js',
+  './src/corpus.js',
+  './src/guardrail.js',
+  // bundled build, when deployed (dist/chunks/* are cached on first use)
+  './index.bundle.html',
+  './dist/main.js',
+  './dist/pipelineWorker.js'
+];
+
+const CORPUS = [
+  './corpus/lexicon_global.json',
+  './corpus/microcopy_corpus.json',
+  './corpus/press_release_corpus.json',
+  './corpus/internal_email_corpus.json',
+  './corpus/investor_note_corpus.json',
+  './corpus/slack_message_corpus.json'
+];
+
+const SHARD_RE = /\/corpus\/dist\/.+\.[0-9a-f]{12}\.json$/;
+const scopeUrl = (p) => new URL(p, self.registration.scope).href;
+
+// --- Install / activate ---
+// Missing optional files (no corpus/dist build, a corpus not deployed) don't fail the install
+async function addAll(cacheName, paths) {
+  const cache = await caches.open(cacheName);
+  await Promise.allSettled(paths.map(p => cache.add(new Request(scopeUrl(p), { cache: 'reload' }))));
+}
+
+// Cache every shard the manifest lists; drop cached shards it no longer lists
+async function syncShards(manifestRes) {
+  let manifest;
+  try { manifest = await manifestRes.json(); } catch { return; }
+  const files = Object.values(manifest?.corpora || {})
+    .flatMap(c => (c.shards || []).map(sh => scopeUrl(sh.file)));
+  const keep = new Set(files);
+  const cache = await caches.open(CORPUS_CACHE);
+  const cached = new Set((await cache.keys()).map(r => r.url));
+  await Promise.allSettled(files.filter(f => !cached.has(f)).map(f => cache.add(f)));
+  await Promise.allSettled([...cached].filter(u => SHARD_RE.test(u) && !keep.has(u)).map(u => cache.delete(u)));
+}
+
+self.addEventListener('install', (event) => {
+  event.waitUntil((async () => {
+    await Promise.all([addAll(SHELL_CACHE, SHELL), addAll(CORPUS_CACHE, [...CORPUS, MANIFEST])]);
+    const m = await (await caches.open(CORPUS_CACHE)).match(scopeUrl(MANIFEST));
+    if (m) await syncShards(m);
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil((async () => {
+    const names = await caches.keys();
+    await Promise.all(names
+      .filter(n => n.startsWith('lemonade-shell-') && n !== SHELL_CACHE)
+      .map(n => caches.delete(n)));
+    await self.clients.claim();
+  })());
+});
+
+// --- Strategies ---
+function cacheKey(url, ignoreSearch) {
+  if (!ignoreSearch) return url.href;
+  const path = url.pathname.endsWith('/') ? `${url.pathname}index.html` : url.pathname;
+  return url.origin + path;
+}
+
+async function staleWhileRevalidate(event, cacheName, ignoreSearch) {
+  const url = new URL(event.request.url);
+  const key = cacheKey(url, ignoreSearch);
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(key);
+  const network = fetch(event.request).then(async (res) => {
+    if (res.ok && res.type === 'basic') {
+      await cache.put(key, res.clone());
+      if (key === scopeUrl(MANIFEST)) await syncShards(res.clone());
+    }
+    return res;
+  });
+  if (cached) {
+    event.waitUntil(network.catch(() => {}));
+    return cached;
+  }
+  return network.catch(async (err) => {
+    // offline navigation to an uncached URL: fall back to the shell page
+    if (event.request.mode === 'navigate') {
+      const shell = await caches.match(scopeUrl('./index.html'));
+      if (shell) return shell;
+    }
+    throw err;
+  });
+}
+
+async function cacheFirst(event, cacheName) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(event.request);
+  if (cached) return cached;
+  const res = await fetch(event.request);
+  if (res.ok && res.type === 'basic') event.waitUntil(cache.put(event.request, res.clone()));
+  return res;
+}
+
+// Pages, ES modules and conditional GETs (corpus.js revalidation): network first, refresh the
+// cache on 200, fall back to the cached copy when offline
+async function networkFirst(event, cacheName, ignoreSearch = false) {
+  const key = cacheKey(new URL(event.request.url), ignoreSearch);
+  const cache = await caches.open(cacheName);
+  try {
+    const res = await fetch(event.request);
+    if (res.ok && res.status === 200 && res.type === 'basic') event.waitUntil(cache.put(key, res.clone()));
+    return res;
+  } catch (err) {
+    const cached = await cache.match(key);
+    if (cached) return cached;
+    // offline navigation to an uncached URL: fall back to the shell page
+    if (event.request.mode === 'navigate') {
+      const shell = await caches.match(scopeUrl('./index.html'));
+      if (shell) return shell;
+    }
+    throw err;
+  }
+}
+
+// --- Routing ---
+self.addEventListener('fetch', (event) => {
+  const req = event.request;
+  if (req.method !== 'GET') return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin || !url.href.startsWith(self.registration.scope)) return;
+
+  if (url.pathname.includes('/corpus/')) {
+    if (SHARD_RE.test(url.pathname)) return event.respondWith(cacheFirst(event, CORPUS_CACHE));
+    if (req.headers.has('if-none-match') || req.headers.has('if-modified-since')) {
+      return event.respondWith(networkFirst(event, CORPUS_CACHE));
+    }
+    return event.respondWith(staleWhileRevalidate(event, CORPUS_CACHE, false));
+  }
+
+  const rel = url.href.slice(self.registration.scope.length).split(/[?#]/)[0];
+  const inShell = req.mode === 'navigate' || rel.startsWith('dist/') || SHELL.some(p => p.replace(/^\.\//, '') === rel);
+  if (!inShell) return;
+  // code and the pages that load it must come from the same deploy
+  if (req.mode === 'navigate' || /\.(js|html)$/.test(rel) || rel === '') {
+    return event.respondWith(networkFirst(event, SHELL_CACHE, true));
+  }
+  return event.respondWith(staleWhileRevalidate(event, SHELL_CACHE, true));
+});